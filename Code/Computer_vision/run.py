@@ -1,6 +1,7 @@
 # Code/Computer_vision/run.py
 import cv2
 import numpy as np
+import threading
 import time
 from pathlib import Path
 import sys
@@ -23,6 +24,10 @@ color_cam_dist   = np.load(COLOR_CAM_DIST_PATH)
 # >>> shared state the bridge reads <<<
 # shape (1,12): [tx,ty,tz, r00 r01 r02 r10 r11 r12 r20 r21 r22]
 object_pose: np.ndarray | None = None
+# incremented on every publish, so readers can tell a new pose from the one they already have
+object_pose_seq: int = 0
+# set on every publish, so readers can block until there is a new pose instead of polling
+object_pose_event = threading.Event()
 
 # >>> shared state for pen tip positions from IMU app <<<
 raw_pen_tip_position: np.ndarray | None = None
@@ -33,8 +38,10 @@ cv_shutdown_requested: bool = False
 
 def _publish_pose(obj_1x12: np.ndarray) -> None:
     """Make the latest pose visible to dodeca_bridge in-process."""
-    global object_pose
+    global object_pose, object_pose_seq
     object_pose = obj_1x12
+    object_pose_seq += 1
+    object_pose_event.set()
 
 def _publish_pen_tip_positions(raw_pos: np.ndarray = None, smoothed_pos: np.ndarray = None) -> None:
     """Make the pen tip positions visible for visualization in CV window."""
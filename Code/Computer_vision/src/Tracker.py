@@ -5,9 +5,11 @@ import cv2.aruco as aruco
 
 def object_tracking(frame, params, text_data, post, show_markers=1):
 	# print(frame.shape)
-	# convert rgb frame into gray-scale
-	frame_gray = cv2.cvtColor(frame.copy(), cv2.COLOR_BGR2GRAY)
-	frame_gray_draw = np.copy(frame_gray)
+	# convert rgb frame into gray-scale, unless the caller already passed a gray frame
+	if frame.ndim == 2:
+		frame_gray = frame
+	else:
+		frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
 	# detect markers, return corners uv position and id of each marker
 	# corners: N-length tuple of (1, 4, 2), ids: (N, 1)
@@ -47,8 +49,9 @@ def object_tracking(frame, params, text_data, post, show_markers=1):
 																					params.marker_size_in_mm, params.mtx, params.dist)
 			# TODO: Camera matrix Calibration   params.mtx, params.dist
 
-			if show_markers:
-				# Draw boundary of detected markers
+			if show_markers and frame.ndim == 3:
+				# Draw boundary of detected markers (not on a gray input frame: that is frame_gray,
+				# which the post-processing below still reads)
 				frame = aruco.drawDetectedMarkers(frame, corners)
 
 			# Input: rt vector in (6,), Output: Transform matrix for one Aruco code in (4,4)
@@ -88,6 +91,7 @@ def object_tracking(frame, params, text_data, post, show_markers=1):
 			if post == 2:
 				############################          DPR refinement         ############################
 				#########################################################################################
+				frame_gray_draw = np.copy(frame_gray)
 				b_edge, edge_intensities_expected = marker_edges(ids, text_data, params)
 				LM_DPR_DRAW(center_pose_ape, frame_gray_draw, ids, corners, b_edge, edge_intensities_expected,
 							text_data, params, 250, 2)
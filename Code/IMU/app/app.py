@@ -29,7 +29,7 @@ from app.color_button import ColorButton
 from app.filter import DpointFilter, blend_new_data
 from app.marker_tracker import CameraReading, run_tracker
 from app.monitor_ble import StopCommand, StylusReading, monitor_ble
-from app.dodeca_bridge import make_ekf_measurements, CENTER_TO_TIP_BODY, IMU_OFFSET_BODY, publish_pen_tip_positions, is_cv_shutdown_requested
+from app.dodeca_bridge import make_ekf_measurements, wait_for_pose, CENTER_TO_TIP_BODY, IMU_OFFSET_BODY, publish_pen_tip_positions, is_cv_shutdown_requested
 from app import dodeca_bridge
 
 _CODE_DIR = Path(__file__).resolve().parents[2]
@@ -95,30 +95,21 @@ class QueueConsumer(QtCore.QObject):
         self._imu_queue = imu_queue
         self._filter = DpointFilter(dt=1/30, smoothing_length=5, camera_delay=0) # Reverted smoothing_length to 5 for controlled testing
         self._trajectory = []
+        self._last_pose_seq = 0
 
     def run_queue_consumer(self):
         print("Queue consumer is starting")
         while not self._should_end:
             if is_cv_shutdown_requested(): break
             try:
-                # Efficiently drain the queue to avoid lag and processing stale data
-                vis = None
-                while True:
-                    # In offline mode, we want to process every frame, but in real-time we'd skip.
-                    # However, make_ekf_measurements currently just reads the latest global state.
-                    # We add a small check to avoid tight-looping if no new data is present.
-                    new_vis = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
-                    if new_vis is None: break
-                    
-                    # If this is the same timestamp as before, don't re-process
-                    if vis and new_vis['timestamp'] == vis['timestamp']:
-                        break
-                    
-                    vis = new_vis
-                    # If we are lagging behind, we only care about the latest pose
-                    break 
+                # make_ekf_measurements reads the latest published pose; skip it if
+                # it's the one we already fed to the filter.
+                vis = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+                if vis is not None and vis["seq"] == self._last_pose_seq:
+                    vis = None
 
                 if vis is not None:
+                    self._last_pose_seq = vis["seq"]
                     # CV provides dodecahedron center position
                     # Filter tracks this position and fuses it with IMU
                     smoothed_tip_pos = self._filter.update_camera(
@@ -134,7 +125,8 @@ class QueueConsumer(QtCore.QObject):
                         self.new_data.emit(CameraUpdateData(position_replace=smoothed_tip_pos))
             except Exception as e:
                 print(f"[QueueConsumer] Error: {e}")
-            time.sleep(0.01)
+            # Sleep until the CV loop publishes the next pose (timeout to notice shutdown)
+            wait_for_pose(timeout=0.1)
         
         print("Queue consumer finishing")
         if self._trajectory:
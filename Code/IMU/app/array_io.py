@@ -0,0 +1,58 @@
+# array_io.py — binary sidecar files for the bulk numeric arrays of a recording.
+#
+# The JSON output keeps the metadata plus a small manifest describing where the
+# arrays went. With python-blosc installed each array is written as its own
+# Blosc-compressed file (lz4 with byte shuffle, which groups the mostly identical
+# exponent bytes of float samples together); otherwise everything goes into one
+# compressed .npz.
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+
+def save_arrays(arrays, base_path):
+    """
+    Write a dict of name -> ndarray next to `base_path` (the JSON file path).
+    Returns the manifest to store in the JSON; pass it to load_arrays to read them back.
+    """
+    base_path = Path(base_path)
+    if blosc is None:
+        npz_path = base_path.with_suffix(".npz")
+        np.savez_compressed(npz_path, **arrays)
+        return {"format": "npz", "file": npz_path.name}
+
+    fields = {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        file_path = base_path.with_suffix(f".{name}.blosc")
+        packed = blosc.compress(arr.tobytes(), typesize=arr.dtype.itemsize, cname="lz4", shuffle=blosc.SHUFFLE)
+        with open(file_path, "wb") as f:
+            f.write(packed)
+        fields[name] = {"file": file_path.name, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+    return {"format": "blosc", "fields": fields}
+
+
+def load_arrays(manifest, directory):
+    """Read the arrays described by a save_arrays manifest from `directory`."""
+    directory = Path(directory)
+    if manifest["format"] == "npz":
+        with np.load(directory / manifest["file"]) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    if manifest["format"] == "blosc":
+        if blosc is None:
+            raise ImportError("python-blosc is required to read this recording (pip install blosc)")
+        arrays = {}
+        for name, field in manifest["fields"].items():
+            with open(directory / field["file"], "rb") as f:
+                raw = blosc.decompress(f.read())
+            arrays[name] = np.frombuffer(raw, dtype=np.dtype(field["dtype"])).reshape(field["shape"])
+        return arrays
+
+    raise ValueError(f"Unknown array format: {manifest['format']}")
@@ -33,6 +33,8 @@ import sys
 import time
 import numpy as np
 
+from app.kernels import mat2quat
+
 # --- Geometry configuration (kept local for simplicity) ---
 # Vector from Dodecaball CENTER → PEN TIP in the body frame (mm→m)
 CENTER_TO_TIP_BODY = np.array([0.0, 137.52252061, -82.07403558]) * 1e-3
@@ -55,8 +57,9 @@ except Exception:
 # --- Quaternion helper with sign continuity ---
 _prev_q = None
 def _rotmat_to_quat(R: np.ndarray) -> np.ndarray:
-    import transforms3d as t3d
-    q = t3d.quaternions.mat2quat(R)  # [w, x, y, z]
+    q = mat2quat(np.ascontiguousarray(R, dtype=np.float64))  # [w, x, y, z]
+    if q[0] < 0.0:
+        q = -q  # w >= 0, as transforms3d's mat2quat returned
     global _prev_q
     if _prev_q is not None and float(np.dot(q, _prev_q)) < 0.0:
         q = -q
@@ -80,7 +83,29 @@ def get_vision_reading():
     R = obj[0, 3:].reshape(3, 3).astype(float)
     return t, R, time.time()
 
+def get_pose_seq() -> int:
+    """Sequence number of the latest pose published by run.py (0 before the first one)."""
+    if dcv_run is None:
+        return 0
+    return getattr(dcv_run, "object_pose_seq", 0)
+
+def wait_for_pose(timeout: float = None) -> bool:
+    """
+    Block until run.py publishes a new pose (or the timeout expires).
+    Returns True if a pose was published since the last call.
+    """
+    event = getattr(dcv_run, "object_pose_event", None) if dcv_run is not None else None
+    if event is None:
+        time.sleep(timeout or 0)
+        return False
+    published = event.wait(timeout)
+    event.clear()
+    return published
+
 # --- EKF measurement packaging ---
+# Last result of make_ekf_measurements: (pose seq, center_to_tip_body, imu_offset_body, measurements)
+_last_measurements = None
+
 def make_ekf_measurements(center_to_tip_body: np.ndarray = CENTER_TO_TIP_BODY,
                           imu_offset_body: np.ndarray = IMU_OFFSET_BODY):
     """
@@ -93,8 +118,18 @@ def make_ekf_measurements(center_to_tip_body: np.ndarray = CENTER_TO_TIP_BODY,
       - q_cam: (4,) [w,x,y,z] - quaternion
       - timestamp: float
       - quality: float
+      - seq: int - pose sequence number (unchanged while the pose is the same)
     or None if no vision reading available.
+    Polling again before a new pose is published returns the same (cached) dict.
     """
+    global _last_measurements
+    # Read the sequence number before the pose: if a publish lands in between, the next
+    # call sees a new number and refreshes, rather than a new pose hiding behind an old one.
+    seq = get_pose_seq()
+    if (_last_measurements is not None and _last_measurements[0] == seq
+            and _last_measurements[1] is center_to_tip_body and _last_measurements[2] is imu_offset_body):
+        return _last_measurements[3]
+
     out = get_vision_reading()
     if out is None:
         return None 
@@ -109,14 +144,17 @@ def make_ekf_measurements(center_to_tip_body: np.ndarray = CENTER_TO_TIP_BODY,
     # Since IMU_OFFSET_BODY = [0,0,0], this currently equals center_pos_cam
 
     q_cam = _rotmat_to_quat(R_cam)
-    return {
+    measurements = {
         "center_pos_cam": center_pos_cam,  # What CV actually detects
         "tip_pos_cam": tip_pos_cam,
         "R_cam": R_cam,
         "q_cam": q_cam,
         "timestamp": ts,
         "quality": 1.0,
+        "seq": seq,
     }
+    _last_measurements = (seq, center_to_tip_body, imu_offset_body, measurements)
+    return measurements
 
 # --- Pen tip position publishing ---
 def publish_pen_tip_positions(raw_pos: np.ndarray = None, smoothed_pos: np.ndarray = None):
@@ -139,6 +177,8 @@ __all__ = [
     "CENTER_TO_TIP_BODY",
     "IMU_OFFSET_BODY",
     "get_vision_reading",
+    "get_pose_seq",
+    "wait_for_pose",
     "make_ekf_measurements",
     "publish_pen_tip_positions",
     "is_cv_shutdown_requested",
@@ -0,0 +1,56 @@
+# frame_ring.py — shared-memory ring of video frames between the recorder and its encoder process.
+#
+# Lets the recorder hand frames to an encoder process without pickling them through a
+# pipe (a 1080p BGR frame is ~6 MB): put() copies the frame into a free slot of an
+# app.shm_ring.ShmRing and publishes it, and the consumer encodes straight from the slot.
+#
+# When the ring is full put() returns False and the frame is dropped, so a slow encoder
+# never stalls the capture loop.
+
+import numpy as np
+
+from app.shm_ring import ShmRing
+
+
+class FrameRing(ShmRing):
+    def __init__(self, frame_shape, slots=4):
+        """Create a ring of `slots` (a power of two) uint8 frames of shape `frame_shape` (e.g. (height, width, 3))."""
+        super().__init__(np.dtype((np.uint8, tuple(frame_shape))), slots, wake=True)
+
+    @property
+    def frame_shape(self):
+        return self.dtype.shape
+
+    def _map(self):
+        super()._map()
+        self._closed = self._header_field(0, np.uint64)
+
+    def _unmap(self):
+        del self._closed
+        super()._unmap()
+
+    def finish(self):
+        """Producer side. No more frames: the consumer's frames() ends once it has drained the ring."""
+        with self._lock:
+            self._closed[0] = 1
+        self.wake()
+
+    def frames(self):
+        """
+        Consumer side. Yields each published frame as a view into its slot, which is handed
+        back to the producer when the next frame is requested. Ends after finish().
+        """
+        while True:
+            # Read `closed` together with the counters, so frames published before
+            # finish() are never mistaken for an empty ring
+            with self._lock:
+                tail = int(self._tail[0])
+                head = int(self._head[0])
+                closed = bool(self._closed[0])
+            if tail < head:
+                yield self._records[tail & self._mask]
+                self.release(1)
+            elif closed:
+                return
+            else:
+                self.wait()
@@ -0,0 +1,102 @@
+# imu_ring.py — shared-memory ring of IMU readings between the BLE process and the recorder.
+#
+# Replaces mp.Queue between the BLE notification handler and the recorder: readings are
+# written as fixed-layout IMU_DTYPE records into an app.shm_ring.ShmRing (lock-ordered
+# head/tail, socketpair wake-ups for a blocking consumer) instead of being pickled
+# through a pipe. The header also carries the BLE master-clock sync offset.
+
+import time
+
+import numpy as np
+
+from app.kernels import drain_ring
+from app.shm_ring import ShmRing
+
+IMU_DTYPE = np.dtype([
+    ("accel", "<f4", (3,)),
+    ("gyro", "<f4", (3,)),
+    ("t", "<f8"),  # Sensor timestamp in ms
+    ("pressure", "<f4"),
+    ("local_ts", "<f8"),  # Wall-clock time (s) when the reading was pushed
+])
+
+
+def load_imu_records(file_path):
+    """Read a file of raw IMU_DTYPE records (the recorder's IMU stream) in one call."""
+    return np.fromfile(file_path, dtype=IMU_DTYPE)
+
+
+def records_to_readings(records):
+    """IMU_DTYPE records -> the usual list of reading dicts (as in imu_data.json)."""
+    return [
+        # local_timestamp: absolute system time (taken by the producer) for fallback/reference
+        {"accel": a, "gyro": g, "t": t, "pressure": p, "local_timestamp": lt}
+        for a, g, t, p, lt in zip(
+            records["accel"].tolist(),
+            records["gyro"].tolist(),
+            records["t"].astype(np.int64).tolist(),
+            records["pressure"].tolist(),
+            records["local_ts"].tolist(),
+        )
+    ]
+
+
+class ImuRing(ShmRing):
+    """
+    Ring of IMU_DTYPE readings. put() takes a StylusReading, the same call as mp.Queue.put,
+    so the ring can be handed to monitor_ble as its data queue.
+    """
+
+    def __init__(self, capacity=4096):
+        """Create a ring for `capacity` readings (a power of two)."""
+        super().__init__(IMU_DTYPE, capacity, wake=True)
+        self._sync[0] = np.nan
+
+    def _map(self):
+        super()._map()
+        self._sync = self._header_field(0, np.float64)
+        # Per-field views of the records, so put() stores straight into each column
+        self._accel = self._records["accel"]
+        self._gyro = self._records["gyro"]
+        self._t = self._records["t"]
+        self._pressure = self._records["pressure"]
+        self._local_ts = self._records["local_ts"]
+
+        # Wall-clock reference for local_ts: one time.time() here, then the cheaper
+        # perf_counter_ns() per reading (which also can't jump with NTP adjustments).
+        self._t0 = time.time()
+        self._pc0 = time.perf_counter_ns()
+
+    def _unmap(self):
+        del self._sync, self._accel, self._gyro, self._t, self._pressure, self._local_ts
+        super()._unmap()
+
+    @property
+    def sync_offset(self):
+        """Master-clock offset (t_sensor - t_system) published by the producer, or None."""
+        offset = float(self._sync[0])
+        return None if np.isnan(offset) else offset
+
+    def set_sync_offset(self, offset):
+        self._sync[0] = offset
+
+    def _write(self, i, reading):
+        # Indexing the field views copies the 3-vectors straight into the slot (with the
+        # float64 -> float32 cast), about 3x faster than assigning through a record object.
+        self._accel[i] = reading.accel
+        self._gyro[i] = reading.gyro
+        self._t[i] = reading.t
+        self._pressure[i] = reading.pressure
+        self._local_ts[i] = self._t0 + (time.perf_counter_ns() - self._pc0) * 1e-9
+
+    def drain_into(self, accel, gyro, t, pressure, local_ts):
+        """
+        Consumer side. Copy pending records into the column arrays (at most len(t) of them,
+        straight from shared memory with no intermediate batch) and free them.
+        Returns the number of records copied.
+        """
+        tail, head = self._span()
+        n = drain_ring(self._accel, self._gyro, self._t, self._pressure, self._local_ts,
+                       tail, head, accel, gyro, t, pressure, local_ts)
+        self.release(n)
+        return n
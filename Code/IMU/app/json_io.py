@@ -0,0 +1,49 @@
+# json_io.py — JSON reading and writing for recordings, using orjson when it is installed.
+#
+# orjson serializes numpy arrays natively (no per-entry .tolist()) and is much
+# faster than the stdlib encoder. The stdlib fallback converts numpy values on
+# the fly so callers can keep arrays in their data dicts either way.
+
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _to_builtin(obj):
+    """Fallback conversion for values neither encoder handles natively."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dump_json(data, file_path, indent=False):
+    """Write `data` to `file_path`. Output is compact unless `indent` is set."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        with open(file_path, "wb") as f:
+            f.write(orjson.dumps(data, default=_to_builtin, option=option))
+    else:
+        with open(file_path, "w") as f:
+            if indent:
+                json.dump(data, f, indent=2, default=_to_builtin)
+            else:
+                json.dump(data, f, separators=(",", ":"), default=_to_builtin)
+
+
+def load_json(file_path):
+    """Read a JSON file."""
+    if orjson is not None:
+        with open(file_path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(file_path, "r") as f:
+        return json.load(f)
+
@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+from numba import njit
+
+# Compiled per-frame kernels for the offline CV processor (process_video_to_cv_data.py),
+# and the IMU ring drain used by the recorder (record_raw_data_filtered.py).
+
+# One-Euro filter state used by process_pose: [t_prev, x_prev (7), dx_prev (7)] for the
+# channels [x, y, z, qw, qx, qy, qz]. t_prev is NaN until the first detection.
+POSE_STATE_SIZE = 15
+
+
+def new_pose_state():
+    """Fresh (uninitialized) filter state for process_pose."""
+    state = np.zeros(POSE_STATE_SIZE)
+    state[0] = np.nan
+    return state
+
+
+@njit(cache=True)
+def mat2quat(R_mat):
+    """
+    Rotation matrix (3,3) -> unit quaternion [w, x, y, z].
+    Branches on the largest of (trace, m00, m11, m22) for numerical stability; the sign
+    convention (largest component positive) matches scipy's Rotation.from_matrix.
+    """
+    m00, m01, m02 = R_mat[0, 0], R_mat[0, 1], R_mat[0, 2]
+    m10, m11, m12 = R_mat[1, 0], R_mat[1, 1], R_mat[1, 2]
+    m20, m21, m22 = R_mat[2, 0], R_mat[2, 1], R_mat[2, 2]
+    q = np.empty(4)
+    tr = m00 + m11 + m22
+    if tr >= m00 and tr >= m11 and tr >= m22:
+        s = math.sqrt(tr + 1.0) * 2.0  # s = 4 * w
+        q[0] = 0.25 * s
+        q[1] = (m21 - m12) / s
+        q[2] = (m02 - m20) / s
+        q[3] = (m10 - m01) / s
+    elif m00 >= m11 and m00 >= m22:
+        s = math.sqrt(1.0 + m00 - m11 - m22) * 2.0  # s = 4 * x
+        q[0] = (m21 - m12) / s
+        q[1] = 0.25 * s
+        q[2] = (m01 + m10) / s
+        q[3] = (m02 + m20) / s
+    elif m11 >= m22:
+        s = math.sqrt(1.0 + m11 - m00 - m22) * 2.0  # s = 4 * y
+        q[0] = (m02 - m20) / s
+        q[1] = (m01 + m10) / s
+        q[2] = 0.25 * s
+        q[3] = (m12 + m21) / s
+    else:
+        s = math.sqrt(1.0 + m22 - m00 - m11) * 2.0  # s = 4 * z
+        q[0] = (m10 - m01) / s
+        q[1] = (m02 + m20) / s
+        q[2] = (m12 + m21) / s
+        q[3] = 0.25 * s
+    return q
+
+
+@njit(cache=True)
+def quat2mat(q):
+    """Unit quaternion [w, x, y, z] -> rotation matrix (3,3)."""
+    w, x, y, z = q[0], q[1], q[2], q[3]
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    R = np.empty((3, 3))
+    R[0, 0] = 1.0 - 2.0 * (yy + zz)
+    R[0, 1] = 2.0 * (xy - wz)
+    R[0, 2] = 2.0 * (xz + wy)
+    R[1, 0] = 2.0 * (xy + wz)
+    R[1, 1] = 1.0 - 2.0 * (xx + zz)
+    R[1, 2] = 2.0 * (yz - wx)
+    R[2, 0] = 2.0 * (xz - wy)
+    R[2, 1] = 2.0 * (yz + wx)
+    R[2, 2] = 1.0 - 2.0 * (xx + yy)
+    return R
+
+
+@njit(cache=True)
+def _smoothing_factor(t_e, cutoff):
+    r = 2 * math.pi * cutoff * t_e
+    return r / (r + 1)
+
+
+@njit(cache=True)
+def process_pose(R_cam, tvec, state, tip_body, t, apply_filter, center, tip, R,
+                 min_cutoff=1.0, beta=0.0, d_cutoff=1.0):
+    """
+    Post-process one detection: mm -> m, One-Euro filtering of position and orientation
+    quaternion, and the tip position R @ tip_body + center.
+    `state` (see new_pose_state) is updated in place. The filter math is the same as
+    OneEuroFilter.filter_signal, run over the 7 channels at once.
+    Results are written into `center` (3,), `tip` (3,) and `R` (3,3), e.g. rows of the
+    caller's output arrays.
+    """
+    for i in range(3):
+        center[i] = tvec[i] / 1000.0
+    R[:, :] = R_cam
+
+    if apply_filter:
+        quat = mat2quat(R_cam)
+        if math.isnan(state[0]):
+            # First detection: initialize the filters and keep the reading as-is
+            state[0] = t
+            state[1:4] = center
+            state[4:8] = quat
+            state[8:15] = 0.0
+        else:
+            t_e = t - state[0]
+            a_d = _smoothing_factor(t_e, d_cutoff)
+            filtered = np.empty(7)
+            for i in range(7):
+                x = center[i] if i < 3 else quat[i - 3]
+                x_prev = state[1 + i]
+                dx = (x - x_prev) / t_e
+                dx_hat = a_d * dx + (1 - a_d) * state[8 + i]
+                a = _smoothing_factor(t_e, min_cutoff + beta * abs(dx_hat))
+                x_hat = a * x + (1 - a) * x_prev
+                state[1 + i] = x_hat
+                state[8 + i] = dx_hat
+                filtered[i] = x_hat
+            state[0] = t
+
+            center[:] = filtered[:3]
+            filtered_quat = filtered[3:]
+            quat_norm = math.sqrt(np.sum(filtered_quat * filtered_quat))
+            if quat_norm > 1e-6:
+                R[:, :] = quat2mat(filtered_quat / quat_norm)
+            else:
+                R[:, :] = quat2mat(quat)  # Fallback to unfiltered
+
+    for i in range(3):
+        tip[i] = center[i] + R[i, 0] * tip_body[0] + R[i, 1] * tip_body[1] + R[i, 2] * tip_body[2]
+
+
+@njit(cache=True)
+def drain_ring(accel, gyro, t, pressure, local_ts, tail, head,
+               out_accel, out_gyro, out_t, out_pressure, out_local_ts):
+    """
+    Copy ring records tail..head (ring indices wrap at the power-of-two capacity) into
+    the first rows of the out_* column arrays, at most as many as they hold.
+    The inputs are the per-field views of an ImuRing. Returns the number copied.
+    """
+    mask = t.shape[0] - 1
+    n = min(head - tail, out_t.shape[0])
+    for k in range(n):
+        i = (tail + k) & mask
+        for j in range(3):
+            out_accel[k, j] = accel[i, j]
+            out_gyro[k, j] = gyro[i, j]
+        out_t[k] = t[i]
+        out_pressure[k] = pressure[i]
+        out_local_ts[k] = local_ts[i]
+    return n
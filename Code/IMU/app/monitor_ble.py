@@ -4,6 +4,7 @@ from bleak import BleakClient, BleakScanner
 from bleak.backends.characteristic import BleakGATTCharacteristic
 import asyncio
 import multiprocessing as mp
+import os
 
 import numpy as np
 
@@ -83,7 +84,7 @@ def get_sync_offset():
 characteristic = "19B10013-E8F2-537E-4F6C-D104768A1214"
 
 
-async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue):
+async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue, on_sync=None):
     while True:
         device = await BleakScanner.find_device_by_name("DPOINT", timeout=5)
         if device is None:
@@ -113,6 +114,8 @@ async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue):
                             print(f"[Sync] t_system_sync: {t_system_arrival:.6f}")
                             print(f"[Sync] t_sensor_sync: {t_sensor_sec:.6f}")
                             print(f"[Sync] Offset (t_sensor - t_system): {sync_offset:.6f}\n")
+                            if on_sync is not None:
+                                on_sync(sync_offset)
                 
                 data_queue.put(reading)
             except Exception as e:
@@ -144,4 +147,37 @@ async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue):
 
 
 def monitor_ble(data_queue: mp.Queue, command_queue: mp.Queue):
-    asyncio.run(monitor_ble_async(data_queue, command_queue))
\ No newline at end of file
+    asyncio.run(monitor_ble_async(data_queue, command_queue))
+
+
+def pin_current_process(core):
+    """
+    Pin the calling process to `core` and, where permitted, give it real-time (SCHED_FIFO)
+    priority; threads it starts afterwards inherit both. Linux only; elsewhere, or without
+    the privileges, this just prints a warning.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        print("[BLE] Warning: CPU pinning is not supported on this platform.")
+        return
+    try:
+        os.sched_setaffinity(0, {core})
+    except OSError as e:
+        print(f"[BLE] Warning: could not pin BLE process to core {core}: {e}")
+        return
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+        print(f"[BLE] Pinned to core {core} (SCHED_FIFO)")
+    except OSError:
+        print(f"[BLE] Pinned to core {core} (no permission for SCHED_FIFO)")
+
+
+def monitor_ble_ring(imu_ring, command_queue: mp.Queue, core=None):
+    """
+    Process target: monitor BLE into a shared-memory ImuRing (app.imu_ring). The sync
+    offset is published in the ring, since get_sync_offset() only sees this process.
+    With `core` set, this process is pinned to it: the notification handler stamps each
+    reading's local timestamp here, so this is where scheduling delays show up as jitter.
+    """
+    if core is not None:
+        pin_current_process(core)
+    asyncio.run(monitor_ble_async(imu_ring, command_queue, on_sync=imu_ring.set_sync_offset))
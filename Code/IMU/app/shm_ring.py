@@ -0,0 +1,160 @@
+# shm_ring.py — single-producer/single-consumer ring of fixed-size records in shared memory.
+#
+# The common core of the recorder's rings (imu_ring.py, frame_ring.py) and the Kalman
+# demo's reading_ring.py: records of one numpy dtype are written into a SharedMemory
+# segment instead of being pickled through a pipe. The producer only advances `head`, the
+# consumer only advances `tail`. Each counter sits on its own 64-byte cache line.
+#
+# Both counters are read and advanced under a multiprocessing lock. Plain numpy stores
+# have no memory barriers, so on weakly ordered CPUs (ARM, e.g. Apple Silicon) the consumer
+# process could see a new `head` before the record bytes behind it, or the producer a new
+# `tail` before the consumer has finished reading the slot. The lock's acquire/release
+# order them on every platform; it is uncontended and costs well under a microsecond.
+#
+# With wake=True the consumer doesn't have to poll: put() writes a byte to a socketpair
+# after publishing a record and wait() blocks in select() on the other end (socketpair
+# rather than os.eventfd/os.pipe so this also works with select on Windows).
+#
+# Producer and consumer may live in different processes: pass the ring as a
+# multiprocessing.Process argument and the child attaches to the same segment, lock and
+# wake-up sockets.
+
+import multiprocessing as mp
+import select
+import socket
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_HEAD_OFFSET = 0
+_DROPPED_OFFSET = 8
+_EXTRA_OFFSET = 16  # 48 bytes for ring-specific header fields, see _header_field
+_TAIL_OFFSET = 64
+_RECORDS_OFFSET = 128
+
+
+class ShmRing:
+    def __init__(self, dtype, capacity, wake=False):
+        """Create a ring for `capacity` (a power of two) records of numpy `dtype`."""
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"capacity must be a power of two, got {capacity}")
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        size = _RECORDS_OFFSET + capacity * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._shm.buf[:_RECORDS_OFFSET] = bytes(_RECORDS_OFFSET)
+        self._lock = mp.Lock()
+        if wake:
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+        else:
+            self._wake_r = self._wake_w = None
+        self._map()
+
+    def _map(self):
+        """Create the numpy views of the segment. Subclasses add their own header fields here."""
+        buf = self._shm.buf
+        self._mask = self.capacity - 1
+        self._head = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=_HEAD_OFFSET)
+        self._dropped = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=_DROPPED_OFFSET)
+        self._tail = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=_TAIL_OFFSET)
+        self._records = np.ndarray((self.capacity,), dtype=self.dtype, buffer=buf, offset=_RECORDS_OFFSET)
+
+    def _unmap(self):
+        del self._head, self._dropped, self._tail, self._records
+
+    def _header_field(self, offset, dtype):
+        """View of one ring-specific header value, `offset` bytes into the 48 spare header bytes."""
+        return np.ndarray((1,), dtype=dtype, buffer=self._shm.buf, offset=_EXTRA_OFFSET + offset)
+
+    def __getstate__(self):
+        return {"name": self._shm.name, "dtype": self.dtype, "capacity": self.capacity,
+                "lock": self._lock, "wake_r": self._wake_r, "wake_w": self._wake_w}
+
+    def __setstate__(self, state):
+        self.dtype = state["dtype"]
+        self.capacity = state["capacity"]
+        self._lock = state["lock"]
+        self._wake_r = state["wake_r"]
+        self._wake_w = state["wake_w"]
+        for sock in (self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.setblocking(False)
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._map()
+
+    @property
+    def dropped(self):
+        """Records the producer had to drop because the ring was full."""
+        return int(self._dropped[0])
+
+    def put(self, record):
+        """
+        Producer side. Copy `record` into the ring; returns False (record dropped, and
+        counted) if it is full.
+        """
+        with self._lock:
+            head = int(self._head[0])
+            if head - int(self._tail[0]) >= self.capacity:
+                self._dropped[0] += 1
+                return False
+            self._write(head & self._mask, record)
+            # Publish only after the record is fully written
+            self._head[0] = head + 1
+        if self._wake_w is not None:
+            self.wake()
+        return True
+
+    def _write(self, i, record):
+        self._records[i] = record
+
+    def wake(self):
+        """Wake up a consumer blocked in wait()."""
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # Socket buffer full of unread wake-ups: the consumer is already due to wake
+
+    def wait(self, timeout=None):
+        """Consumer side. Block until put() or wake() is called (or the timeout expires)."""
+        ready, _, _ = select.select([self._wake_r], [], [], timeout)
+        if ready:
+            try:
+                self._wake_r.recv(4096)
+            except BlockingIOError:
+                pass
+        return bool(ready)
+
+    def _span(self):
+        """Consumer side. (tail, head): the records tail..head-1 are published and unread."""
+        with self._lock:
+            return int(self._tail[0]), int(self._head[0])
+
+    def release(self, n):
+        """Consumer side. Hand the oldest `n` records back to the producer."""
+        with self._lock:
+            self._tail[0] = int(self._tail[0]) + n
+
+    def drain(self):
+        """Consumer side. Returns a copy of all pending records (possibly empty) and frees them."""
+        tail, head = self._span()
+        start = tail & self._mask
+        end = start + head - tail
+        if end <= self.capacity:
+            batch = self._records[start:end].copy()
+        else:
+            batch = np.concatenate([self._records[start:], self._records[:end - self.capacity]])
+        self.release(len(batch))
+        return batch
+
+    def close(self):
+        # Drop the numpy views first, SharedMemory can't close while they export the buffer
+        self._unmap()
+        self._shm.close()
+        for sock in (self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.close()
+
+    def unlink(self):
+        self._shm.unlink()
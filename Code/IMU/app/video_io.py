@@ -0,0 +1,100 @@
+# video_io.py — video writer for the recorder, using the GPU (NVENC) encoder when available.
+#
+# OpenCV's mp4v writer encodes on the CPU and can take a full core at high resolutions,
+# competing with the capture loop and the IMU thread. When ffmpeg is on the PATH and
+# has a working h264_nvenc encoder, frames are piped to it as raw BGR instead and the
+# GPU does the encoding. Otherwise this falls back to cv2.VideoWriter.
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import cv2
+
+NVENC_ARGS = ["-c:v", "h264_nvenc", "-preset", "p4", "-tune", "ll", "-rc", "vbr", "-cq", "23"]
+
+
+def timestamps_path(video_path):
+    """Per-frame capture timestamps written by the recorder next to its video (video.timestamps.npy)."""
+    return Path(video_path).with_suffix(".timestamps.npy")
+
+
+def nvenc_available():
+    """True if ffmpeg is installed and can actually encode with h264_nvenc (needs an NVIDIA GPU)."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    try:
+        encoders = subprocess.run([ffmpeg, "-hide_banner", "-encoders"],
+                                  capture_output=True, text=True, timeout=10).stdout
+        if "h264_nvenc" not in encoders:
+            return False
+        # Listed encoders only reflect the build; try one frame to check for a usable device
+        probe = subprocess.run([ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                                "-i", "color=size=256x256", "-frames:v", "1", *NVENC_ARGS, "-f", "null", "-"],
+                               capture_output=True, timeout=10)
+        return probe.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+class FfmpegWriter:
+    """Same write()/release() interface as cv2.VideoWriter, encoding with ffmpeg in a subprocess."""
+
+    def __init__(self, path, fps, size, codec_args=NVENC_ARGS):
+        width, height = size
+        self._proc = subprocess.Popen(
+            [shutil.which("ffmpeg"), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+             *codec_args, "-pix_fmt", "yuv420p", str(path)],
+            stdin=subprocess.PIPE,
+        )
+
+    def isOpened(self):
+        return self._proc.poll() is None
+
+    def write(self, frame):
+        self._proc.stdin.write(frame.data)  # Contiguous BGR frame, written without a copy
+
+    def release(self):
+        if self._proc.stdin is not None and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg already exited; its error is on stderr
+        self._proc.wait()
+
+
+def open_video_writer(path, fps, size, encoder="auto"):
+    """
+    Writer for the recorder's video. `encoder` is "nvenc", "mp4v", or "auto" (NVENC if
+    available, else mp4v). Returns (writer, encoder name actually used).
+    """
+    if encoder in ("auto", "nvenc"):
+        if nvenc_available():
+            return FfmpegWriter(path, fps, size), "nvenc"
+        if encoder == "nvenc":
+            print("[Video] Warning: NVENC not available (needs ffmpeg with h264_nvenc and an NVIDIA GPU). Using mp4v.")
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(str(path), fourcc, fps, size), "mp4v"
+
+
+def encode_frames(frame_ring, path, fps, size, encoder="auto", ready=None):
+    """
+    Process target: encode the frames published to `frame_ring` (app.frame_ring.FrameRing)
+    into `path` until the producer calls finish(), so encoding never blocks the capture loop.
+    `ready` (an mp.Event) is set once the writer is open.
+    """
+    writer, used = open_video_writer(path, fps, size, encoder)
+    print(f"[Video] Encoder: {used}")
+    if ready is not None:
+        ready.set()
+    frame = None
+    try:
+        for frame in frame_ring.frames():
+            writer.write(frame)
+    finally:
+        # Drop the last frame first, it is a view into the ring (which can't close while it is alive)
+        frame = None
+        writer.release()
+        frame_ring.close()
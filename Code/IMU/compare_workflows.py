@@ -1,5 +1,4 @@
 
-import json
 import os
 import sys
 import numpy as np
@@ -20,6 +19,7 @@ from app.imu_alignment import (
 )
 from app.monitor_ble import StylusReading
 from app.dodeca_bridge import CENTER_TO_TIP_BODY
+from app.json_io import load_json
 import app.filter_core as fc
 
 DEFAULT_DT = 1.0 / 60.0
@@ -97,8 +97,7 @@ def run_workflow(input_file, mode="decoupled", calibration_path=None):
     - 'standard': Use 7D CV updates (Pos + Quat).
     - 'decoupled': Use 3D CV updates (Pos only).
     """
-    with open(input_file, "r") as f:
-        data = json.load(f)
+    data = load_json(input_file)
     
     imu_readings = data.get("imu_readings", [])
     cv_readings = data.get("cv_readings", [])
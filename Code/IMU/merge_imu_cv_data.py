@@ -4,25 +4,53 @@ Combines separately recorded IMU and CV data into a single my_data.json format.
 Handles timestamp alignment and synchronization.
 """
 
-import json
 import sys
 from pathlib import Path
 import numpy as np
 import argparse
 
+from app.array_io import load_arrays
+from app.imu_ring import IMU_DTYPE, load_imu_records, records_to_readings
+from app.json_io import dump_json, load_json
 
-def load_json(file_path):
-    """Load JSON file"""
-    with open(file_path, 'r') as f:
-        return json.load(f)
 
+def load_imu_data(file_path):
+    """
+    Load IMU data JSON. Recordings that keep their readings in a separate file
+    (see record_raw_data_filtered.py) are expanded into the usual list of dicts.
+    """
+    data = load_json(file_path)
+    if "imu_readings" in data:
+        return data
+    if "imu_file" in data:
+        imu_file = data["imu_file"]
+        if imu_file["format"] != "records":
+            raise ValueError(f"Unknown IMU file format: {imu_file['format']}")
+        if imu_file["record_size"] != IMU_DTYPE.itemsize:
+            raise ValueError(f"IMU records of {imu_file['record_size']} bytes, expected {IMU_DTYPE.itemsize}")
+        records = load_imu_records(Path(file_path).parent / imu_file["file"])
+        data["imu_readings"] = records_to_readings(records)
+    return data
+
+
+def load_cv_data(file_path):
+    """
+    Load CV data JSON. Rotation matrices kept in a binary sidecar (see
+    process_video_to_cv_data.py) are put back into each reading as R_cam.
+    """
+    data = load_json(file_path)
+    if "cv_arrays" in data:
+        arrays = load_arrays(data["cv_arrays"], Path(file_path).parent)
+        for reading, R_cam in zip(data["cv_readings"], arrays["R_cam"].astype(np.float64).tolist()):
+            reading["R_cam"] = R_cam
+    return data
 
-def save_json(data, file_path):
-    """Save JSON file"""
+
+def save_json(data, file_path, pretty=False):
+    """Save JSON file (compact unless `pretty` is set)"""
     output_path = Path(file_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    dump_json(data, output_path, indent=pretty)
 
 
 def find_sync_point(imu_data, cv_data, method="first_detection"):
@@ -123,26 +151,32 @@ def align_timestamps(readings, sync_offset, allow_negative=False, use_sensor_t=F
     Returns:
         List of readings with aligned timestamps
     """
+    # Source timestamps as one array, so the offset and the sync-point test run vectorized
+    if use_sensor_t:
+        t_src = (r["t"] / 1000.0 if "t" in r else r["local_timestamp"] for r in readings)  # ms -> s
+    else:
+        t_src = (r["local_timestamp"] for r in readings)
+    t_src = np.fromiter(t_src, dtype=np.float64, count=len(readings))
+    
+    # Include readings at or after sync point, or before if allow_negative=True
+    if allow_negative:
+        keep = np.arange(len(readings))
+    else:
+        keep = np.flatnonzero(t_src >= sync_offset)
+    
     aligned = []
-    for reading in readings:
-        # Determine the source timestamp
-        if use_sensor_t and "t" in reading:
-            t_src = reading["t"] / 1000.0  # Convert ms to seconds
-        else:
-            t_src = reading["local_timestamp"]
-            
-        # Include readings at or after sync point, or before if allow_negative=True
-        if allow_negative or t_src >= sync_offset:
-            aligned_reading = reading.copy()
-            # CRITICAL: Update both timestamp fields to maintain consistency
-            aligned_reading["timestamp"] = t_src - sync_offset
-            aligned_reading["local_timestamp"] = t_src - sync_offset
-            aligned.append(aligned_reading)
+    for i, t in zip(keep.tolist(), (t_src[keep] - sync_offset).tolist()):
+        aligned_reading = readings[i].copy()
+        # CRITICAL: Update both timestamp fields to maintain consistency
+        aligned_reading["timestamp"] = t
+        aligned_reading["local_timestamp"] = t
+        aligned.append(aligned_reading)
     
     return aligned
 
 
-def merge_data(imu_file, cv_file, output_file, sync_method="first_detection", manual_offset=0.0):
+def merge_data(imu_file, cv_file, output_file, sync_method="first_detection", manual_offset=0.0,
+               pretty=False):
     """
     Merge IMU and CV data into unified format.
     
@@ -159,10 +193,10 @@ def merge_data(imu_file, cv_file, output_file, sync_method="first_detection", ma
     
     # Load data
     print(f"[Merge] Loading IMU data from: {imu_file}")
-    imu_data = load_json(imu_file)
+    imu_data = load_imu_data(imu_file)
     
     print(f"[Merge] Loading CV data from: {cv_file}")
-    cv_data = load_json(cv_file)
+    cv_data = load_cv_data(cv_file)
     
     # Detect if master clock was used
     is_master_clock = should_use_master_clock(imu_data, cv_data)
@@ -227,7 +261,7 @@ def merge_data(imu_file, cv_file, output_file, sync_method="first_detection", ma
     
     # Save merged data
     print(f"[Merge] Saving merged data to: {output_file}")
-    save_json(merged_data, output_file)
+    save_json(merged_data, output_file, pretty=pretty)
     
     # Print summary
     print("\n" + "=" * 60)
@@ -258,6 +292,8 @@ def main():
                        help="Synchronization method")
     parser.add_argument("--offset", type=float, default=0.0,
                        help="Manual time offset in seconds (CV - IMU), only used with --sync manual")
+    parser.add_argument("--pretty", action="store_true",
+                       help="Indent the output JSON (larger and slower to write)")
     
     args = parser.parse_args()
     
@@ -266,7 +302,8 @@ def main():
         args.cv_file,
         args.output,
         sync_method=args.sync,
-        manual_offset=args.offset
+        manual_offset=args.offset,
+        pretty=args.pretty
     )
 
 
@@ -4,13 +4,12 @@ Processes a recorded video file and generates CV data in my_data.json format.
 This uses the same CV pipeline that works well for offline videos.
 """
 
-import json
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
 import cv2
-from scipy.spatial.transform import Rotation as R
 
 # Add project directories to sys.path
 repo_root = Path(__file__).resolve().parents[1]
@@ -19,7 +18,10 @@ sys.path.append(str(repo_root / "Computer_vision" / "src"))
 
 try:
     from app.dodeca_bridge import CENTER_TO_TIP_BODY, IMU_OFFSET_BODY
-    from filter import OneEuroFilter
+    from app.array_io import save_arrays
+    from app.json_io import dump_json, load_json
+    from app.kernels import new_pose_state, process_pose
+    from app.video_io import timestamps_path
     import src.DoDecahedronUtils as dodecapen
     import src.Tracker as tracker
 except ImportError as e:
@@ -28,11 +30,118 @@ except ImportError as e:
     sys.exit(1)
 
 
+def cuda_available():
+    """True if this OpenCV build has CUDA support and a CUDA device is present."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _detect_frame_range(video_path, start, stop, detect_scale=1.0, total_frames=0, use_cuda=False):
+    """
+    Run DodecaPen tracking on frames [start, stop) of a video (stop=None reads to the end).
+    Module-level so it can run in a ProcessPoolExecutor worker; each call opens its own capture.
+    With use_cuda, the gray conversion and downscaling run on the GPU; marker detection
+    itself stays on the CPU.
+    Returns (frames_read, detections) where detections is a list of
+    (frame_index, tvec_mm (3,), R_cam (3,3)).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video file: {video_path}")
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    
+    # Load DodecaPen calibration
+    ddc_text_data = dodecapen.txt_data()
+    ddc_params = dodecapen.parameters()
+    post = 1
+    
+    # Detect on downscaled frames: scale the intrinsics to match the smaller image.
+    # Poses come back in the same metric units, so nothing needs to be scaled back.
+    scale = detect_scale
+    if scale != 1.0:
+        ddc_params.mtx = np.diag([scale, scale, 1.0]) @ ddc_params.mtx
+    
+    range_end = stop if stop is not None else total_frames
+    label = f"[CV Processor] Frames {start}-{range_end}:" if start > 0 or stop is not None else "[CV Processor]"
+    
+    frame_idx = start
+    detections = []
+    gpu_frame = cv2.cuda_GpuMat() if use_cuda else None
+    
+    # Decode every frame into the same buffer instead of a fresh array per frame
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    try:
+        while stop is None or frame_idx < stop:
+            ret, rgb = cap.read(rgb)
+            if not ret or rgb is None:
+                break
+            
+            # Run object tracking on a single gray conversion of the frame.
+            # Nothing is displayed offline, so marker drawing is disabled.
+            if use_cuda:
+                gpu_frame.upload(rgb)
+                gpu_gray = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2GRAY)
+                if scale != 1.0:
+                    size = (round(rgb.shape[1] * scale), round(rgb.shape[0] * scale))
+                    gpu_gray = cv2.cuda.resize(gpu_gray, size, interpolation=cv2.INTER_AREA)
+                gray = gpu_gray.download()
+            else:
+                gray = cv2.cvtColor(rgb, cv2.COLOR_BGR2GRAY)
+                if scale != 1.0:
+                    gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            obj = tracker.object_tracking(gray, ddc_params, ddc_text_data, post, show_markers=0)
+            
+            if obj is not None:
+                arr = np.asarray(obj, dtype=float).reshape(-1)
+                
+                # Parse tracking result
+                if arr.size == 6:
+                    # [rvec(3), tvec(3)] → [t, R]
+                    rvec = arr[:3].astype(np.float64).reshape(3, 1)
+                    tvec = arr[3:].astype(np.float64).reshape(3,)
+                    R_cam, _ = cv2.Rodrigues(rvec)
+                    detections.append((frame_idx, tvec, R_cam))
+                elif arr.size == 12:
+                    tvec = arr[:3].astype(np.float64).reshape(3,)
+                    R_cam = arr[3:].astype(np.float64).reshape(3, 3)
+                    detections.append((frame_idx, tvec, R_cam))
+                elif arr.size == 16:
+                    T = arr.reshape(4, 4)
+                    R_cam = T[:3, :3].astype(np.float64)
+                    tvec = T[:3, 3].astype(np.float64)
+                    detections.append((frame_idx, tvec, R_cam))
+            
+            frame_idx += 1
+            
+            # Progress update
+            done = frame_idx - start
+            if done % 100 == 0:
+                todo = range_end - start
+                progress = (done / todo) * 100 if todo > 0 else 0
+                print(f"{label} Processed {done}/{todo} frames ({progress:.1f}%) - Detections: {len(detections)}")
+    finally:
+        cap.release()
+    
+    return frame_idx - start, detections
+
+
 class OfflineCVProcessor:
-    def __init__(self, video_path, output_file="cv_data.json", apply_filter=True):
+    def __init__(self, video_path, output_file="cv_data.json", apply_filter=True, detect_scale=1.0,
+                 use_cuda=False):
         self.video_path = Path(video_path)
         self.output_file = output_file
+        self._out_dir = Path(output_file).parent
         self.apply_filter = apply_filter
+        self.detect_scale = detect_scale
+        
+        self.use_cuda = use_cuda and cuda_available()
+        if use_cuda and not self.use_cuda:
+            print("[CV Processor] Warning: no CUDA device available in this OpenCV build. Using CPU.")
         
         if not self.video_path.exists():
             raise FileNotFoundError(f"Video file not found: {video_path}")
@@ -44,28 +153,63 @@ class OfflineCVProcessor:
                 "imu_to_tip_body": IMU_OFFSET_BODY.tolist(),
                 "filtered": apply_filter,
                 "filter_type": "OneEuro" if apply_filter else "None",
+                "detect_scale": detect_scale,
                 "video_source": str(video_path)
             },
             "cv_readings": []
         }
+        # Bulk per-reading arrays written next to the JSON by save()
+        self.arrays = {}
         
-        # One-Euro filters (initialized on first reading)
-        self.filters_initialized = False
-        self.filter_x = None
-        self.filter_y = None
-        self.filter_z = None
-        self.filter_qw = None
-        self.filter_qx = None
-        self.filter_qy = None
-        self.filter_qz = None
+        # Center→tip offset as a contiguous float64 vector for the pose kernel
+        self._tip_body = np.ascontiguousarray(CENTER_TO_TIP_BODY, dtype=np.float64).reshape(3)
+        
+        # One-Euro filter state for position + orientation (initialized on first reading)
+        self.filter_state = new_pose_state()
     
-    def process_video(self, video_start_timestamp=None, t_cv_start_system=None, sync_offset=None):
+    def _frame_timestamps(self, n_frames, fps, video_start_timestamp, t_cv_start_system, sync_offset):
+        """
+        Timestamp of every frame in the video.
+        Uses the per-frame capture times logged by the recorder (<video>.timestamps.npy) when
+        available, since webcams jitter and drop frames; otherwise assumes frame_index / fps.
+        """
+        frame_ts = None
+        frame_ts_path = timestamps_path(self.video_path)
+        if frame_ts_path.exists():
+            frame_ts = np.load(frame_ts_path)
+            if len(frame_ts) == n_frames:
+                print(f"[CV Processor] Using recorded frame timestamps: {frame_ts_path}")
+                self.data["metadata"]["frame_timestamps"] = str(frame_ts_path)
+            else:
+                # Not this video's timestamps (or a truncated file): don't apply them partially
+                print(f"[CV Processor] Warning: {len(frame_ts)} timestamps in {frame_ts_path} for "
+                      f"{n_frames} frames. Ignoring them and assuming frame_index / fps.")
+                frame_ts = None
+
+        master_clock = t_cv_start_system is not None and sync_offset is not None
+        if frame_ts is not None:
+            if master_clock:
+                return frame_ts + sync_offset
+            ref = t_cv_start_system if t_cv_start_system is not None else frame_ts[0]
+            return video_start_timestamp + (frame_ts - ref)
+
+        frame_numbers = np.arange(1, n_frames + 1)
+        if master_clock:
+            # Master Clock domain: t_sensor = (t_cv_start_system + frame_index / fps) + offset
+            return (t_cv_start_system + frame_numbers / fps) + sync_offset
+        # Fallback to absolute system time
+        return video_start_timestamp + frame_numbers / fps
+    
+    def process_video(self, video_start_timestamp=None, t_cv_start_system=None, sync_offset=None, workers=1):
         """
         Process the video file and extract CV data.
+        Marker detection runs in `workers` processes over contiguous frame ranges; the
+        One-Euro filter, which is the only causal stage, then runs once over all detections.
         Args:
             video_start_timestamp: The absolute system timestamp when the video recording started.
             t_cv_start_system: The monotonic system timestamp when the video recording started.
             sync_offset: The offset (t_sensor - t_system) established during recording.
+            workers: Number of detection processes.
         """
         print(f"[CV Processor] Opening video: {self.video_path}")
         cap = cv2.VideoCapture(str(self.video_path))
@@ -77,19 +221,18 @@ class OfflineCVProcessor:
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         duration = total_frames / fps if fps > 0 else 0
+        cap.release()
         
         print(f"[CV Processor] Video properties:")
         print(f"  FPS: {fps:.2f}")
         print(f"  Total frames: {total_frames}")
         print(f"  Duration: {duration:.2f} seconds")
         
-        # Load DodecaPen calibration
-        ddc_text_data = dodecapen.txt_data()
-        ddc_params = dodecapen.parameters()
-        post = 1
+        if self.detect_scale != 1.0:
+            print(f"[CV Processor] Detecting on frames downscaled by {self.detect_scale:g}")
+        if self.use_cuda:
+            print("[CV Processor] Preprocessing frames on the GPU (CUDA)")
         
-        frame_count = 0
-        detection_count = 0
         start_time_proc = time.time()
         
         # If no start timestamp is provided, we use 0 (the merge script will handle alignment)
@@ -111,124 +254,61 @@ class OfflineCVProcessor:
         # Update metadata
         self.data["metadata"]["start_time"] = video_start_timestamp
         
-        print("[CV Processor] Processing frames...")
+        # Detection stage: split the video into contiguous frame ranges, one per worker.
+        # The last range is open-ended because CAP_PROP_FRAME_COUNT is only an estimate.
+        workers = max(1, min(workers, total_frames)) if total_frames > 0 else 1
+        bounds = [i * total_frames // workers for i in range(workers)] + [None]
+        print(f"[CV Processor] Processing frames with {workers} worker(s)...")
         
-        try:
-            while True:
-                ret, rgb = cap.read()
-                if not ret or rgb is None:
-                    break
-                
-                frame_count += 1
-                
-                # Calculate timestamp based on frame number and FPS
-                if t_cv_start_system is not None and sync_offset is not None:
-                    # Master Clock domain: t_sensor = (t_cv_start_system + frame_index / fps) + offset
-                    frame_timestamp = (t_cv_start_system + (frame_count / fps)) + sync_offset
-                else:
-                    # Fallback to absolute system time
-                    frame_timestamp = video_start_timestamp + (frame_count / fps)
-                
-                # Run object tracking
-                obj = tracker.object_tracking(rgb, ddc_params, ddc_text_data, post)
-                
-                if obj is not None:
-                    arr = np.asarray(obj, dtype=float).reshape(-1)
-                    
-                    # Parse tracking result
-                    if arr.size == 6:
-                        # [rvec(3), tvec(3)] → [t, R]
-                        rvec = arr[:3].astype(np.float64).reshape(3, 1)
-                        tvec = arr[3:].astype(np.float64).reshape(3,)
-                        R_cam, _ = cv2.Rodrigues(rvec)
-                    elif arr.size == 12:
-                        tvec = arr[:3].astype(np.float64).reshape(3,)
-                        R_cam = arr[3:].astype(np.float64).reshape(3, 3)
-                    elif arr.size == 16:
-                        T = arr.reshape(4, 4)
-                        R_cam = T[:3, :3].astype(np.float64)
-                        tvec = T[:3, 3].astype(np.float64)
-                    else:
-                        continue
-                    
-                    # Convert tvec from mm to meters (dodecapen outputs in mm)
-                    center_pos = tvec / 1000.0
-                    
-                    # Convert rotation matrix to quaternion [w, x, y, z]
-                    quat_xyzw = R.from_matrix(R_cam).as_quat()  # [x, y, z, w]
-                    quat = np.array([quat_xyzw[3], quat_xyzw[0], quat_xyzw[1], quat_xyzw[2]])  # [w, x, y, z]
-                    
-                    # Apply One-Euro filter if enabled
-                    if self.apply_filter:
-                        if not self.filters_initialized:
-                            # Initialize filters on first detection
-                            self.filter_x = OneEuroFilter(frame_timestamp, center_pos[0])
-                            self.filter_y = OneEuroFilter(frame_timestamp, center_pos[1])
-                            self.filter_z = OneEuroFilter(frame_timestamp, center_pos[2])
-                            self.filter_qw = OneEuroFilter(frame_timestamp, quat[0])
-                            self.filter_qx = OneEuroFilter(frame_timestamp, quat[1])
-                            self.filter_qy = OneEuroFilter(frame_timestamp, quat[2])
-                            self.filter_qz = OneEuroFilter(frame_timestamp, quat[3])
-                            self.filters_initialized = True
-                            
-                            # Store first reading as-is
-                            filtered_center = center_pos
-                            filtered_R = R_cam
-                        else:
-                            # Apply One-Euro filter
-                            filtered_x = self.filter_x.filter_signal(frame_timestamp, center_pos[0])
-                            filtered_y = self.filter_y.filter_signal(frame_timestamp, center_pos[1])
-                            filtered_z = self.filter_z.filter_signal(frame_timestamp, center_pos[2])
-                            
-                            filtered_qw = self.filter_qw.filter_signal(frame_timestamp, quat[0])
-                            filtered_qx = self.filter_qx.filter_signal(frame_timestamp, quat[1])
-                            filtered_qy = self.filter_qy.filter_signal(frame_timestamp, quat[2])
-                            filtered_qz = self.filter_qz.filter_signal(frame_timestamp, quat[3])
-                            
-                            # Normalize quaternion
-                            filtered_quat = np.array([filtered_qw, filtered_qx, filtered_qy, filtered_qz])
-                            quat_norm = np.linalg.norm(filtered_quat)
-                            if quat_norm > 1e-6:
-                                filtered_quat = filtered_quat / quat_norm
-                            else:
-                                filtered_quat = quat  # Fallback to unfiltered
-                            
-                            # Reconstruct rotation matrix
-                            filtered_R = R.from_quat([filtered_quat[1], filtered_quat[2], 
-                                                       filtered_quat[3], filtered_quat[0]]).as_matrix()
-                            
-                            filtered_center = np.array([filtered_x, filtered_y, filtered_z])
-                    else:
-                        # No filtering
-                        filtered_center = center_pos
-                        filtered_R = R_cam
-                    
-                    # Calculate tip position in camera frame
-                    # Tip = Center + R_cam @ CENTER_TO_TIP_BODY
-                    filtered_tip = filtered_center + filtered_R @ CENTER_TO_TIP_BODY
-                    
-                    # Create CV reading entry (matching my_data.json structure)
-                    # We include both center and tip positions for full compatibility
-                    cv_entry = {
-                        "timestamp": frame_timestamp,
-                        "local_timestamp": frame_timestamp,
-                        "center_pos_cam": filtered_center.tolist(),
-                        "imu_pos_cam": filtered_center.tolist(), # Backward compatibility
-                        "tip_pos_cam": filtered_tip.tolist(),
-                        "R_cam": filtered_R.tolist(),
-                    }
-                    
-                    self.data["cv_readings"].append(cv_entry)
-                    detection_count += 1
-                
-                # Progress update
-                if frame_count % 100 == 0:
-                    progress = (frame_count / total_frames) * 100 if total_frames > 0 else 0
-                    print(f"[CV Processor] Processed {frame_count}/{total_frames} frames ({progress:.1f}%) - Detections: {detection_count}")
+        if workers == 1:
+            results = [_detect_frame_range(str(self.video_path), 0, None, self.detect_scale, total_frames,
+                                           self.use_cuda)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(_detect_frame_range, str(self.video_path), bounds[i], bounds[i + 1],
+                                    self.detect_scale, total_frames, self.use_cuda)
+                    for i in range(workers)
+                ]
+                results = [future.result() for future in futures]
+        
+        frame_count = sum(frames_read for frames_read, _ in results)
+        detections = sorted((d for _, dets in results for d in dets), key=lambda d: d[0])
+        
+        # Filtering stage: timestamps and One-Euro filter, in frame order
+        n_frames = max(frame_count, total_frames, detections[-1][0] + 1 if detections else 0)
+        timestamps = self._frame_timestamps(n_frames, fps, video_start_timestamp, t_cv_start_system, sync_offset)
+        
+        # Per-detection results go into preallocated arrays (one row per detection)
+        n = len(detections)
+        cv_timestamps = timestamps[[frame_idx for frame_idx, _, _ in detections]]
+        centers = np.empty((n, 3))
+        tips = np.empty((n, 3))
+        rotations = np.empty((n, 3, 3))
         
-        finally:
-            cap.release()
+        for i, (_, tvec, R_cam) in enumerate(detections):
+            # mm -> m, One-Euro filter (if enabled) and tip = center + R_cam @ CENTER_TO_TIP_BODY
+            process_pose(R_cam, tvec, self.filter_state, self._tip_body, cv_timestamps[i], self.apply_filter,
+                         centers[i], tips[i], rotations[i])
         
+        # Create CV reading entries (matching my_data.json structure)
+        # We include both center and tip positions for full compatibility
+        # Entries hold row views of the arrays above; they are serialized directly in save()
+        self.data["cv_readings"] = [
+            {
+                "timestamp": t,
+                "local_timestamp": t,
+                "center_pos_cam": centers[i],
+                "imu_pos_cam": centers[i],  # Backward compatibility
+                "tip_pos_cam": tips[i],
+            }
+            for i, t in enumerate(cv_timestamps.tolist())
+        ]
+        # Rotation matrices go to a binary sidecar instead of 9 JSON numbers per reading
+        # (merge_imu_cv_data.py puts them back as R_cam)
+        self.arrays["R_cam"] = rotations.astype(np.float32)
+        
+        detection_count = len(detections)
         processing_time = time.time() - start_time_proc
         
         print(f"\n[CV Processor] Processing complete:")
@@ -238,16 +318,19 @@ class OfflineCVProcessor:
         print(f"  Processing time: {processing_time:.2f} seconds")
         print(f"  Processing speed: {frame_count/processing_time:.1f} FPS")
     
-    def save(self):
-        """Save CV data to JSON file"""
-        self.data["metadata"]["end_time"] = time.time()
-        self.data["metadata"]["cv_count"] = len(self.data["cv_readings"])
+    def save(self, pretty=False):
+        """Save CV data to JSON file (compact unless `pretty` is set)"""
+        self.data["metadata"].update({
+            "end_time": time.time(),
+            "cv_count": len(self.data["cv_readings"]),
+        })
         
         output_path = Path(self.output_file)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._out_dir.mkdir(parents=True, exist_ok=True)
         
-        with open(output_path, "w") as f:
-            json.dump(self.data, f, indent=2)
+        if self.arrays:
+            self.data["cv_arrays"] = save_arrays(self.arrays, output_path)
+        dump_json(self.data, output_path, indent=pretty)
         
         print(f"\n[CV Processor] CV data saved to: {output_path}")
         print(f"[CV Processor] Total CV readings: {len(self.data['cv_readings'])}")
@@ -259,12 +342,25 @@ def main():
     parser.add_argument("video", help="Path to video file")
     parser.add_argument("--output", default="outputs/cv_data.json", help="Output CV data JSON file")
     parser.add_argument("--no-filter", action="store_true", help="Disable One-Euro filtering")
+    parser.add_argument("--detect-scale", type=float, default=1.0,
+                        help="Downscale frames by this factor before marker detection (e.g. 0.5 for ~4x fewer pixels)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes for marker detection (frame ranges are processed in parallel)")
+    parser.add_argument("--cuda", action="store_true",
+                        help="Do gray conversion and downscaling on the GPU (needs a CUDA-enabled OpenCV build)")
+    parser.add_argument("--pretty", action="store_true",
+                        help="Indent the output JSON (larger and slower to write)")
     args = parser.parse_args()
     
+    if not 0.0 < args.detect_scale <= 1.0:
+        parser.error("--detect-scale must be in (0, 1]")
+    
     processor = OfflineCVProcessor(
         args.video,
         args.output,
-        apply_filter=not args.no_filter
+        apply_filter=not args.no_filter,
+        detect_scale=args.detect_scale,
+        use_cuda=args.cuda
     )
     
     # If processing the default outputs/video.mp4, try to find its start time from imu_data.json
@@ -276,19 +372,18 @@ def main():
         imu_json = Path(args.video).parent / "imu_data.json"
         if imu_json.exists():
             try:
-                with open(imu_json, 'r') as f:
-                    imu_data = json.load(f)
-                    video_start_time = imu_data.get("metadata", {}).get("start_time")
-                    
-                    # Try to get Master Clock sync info
-                    video_meta = imu_data.get("video_metadata", {})
-                    t_cv_start_system = video_meta.get("t_cv_start_system")
-                    sync_offset = video_meta.get("sync_offset")
-                    
-                    if video_start_time:
-                        print(f"[CV Processor] Found video start time: {video_start_time}")
-                    if t_cv_start_system and sync_offset:
-                        print(f"[CV Processor] Found Master Clock sync info in imu_data.json")
+                imu_data = load_json(imu_json)
+                video_start_time = imu_data.get("metadata", {}).get("start_time")
+                
+                # Try to get Master Clock sync info
+                video_meta = imu_data.get("video_metadata", {})
+                t_cv_start_system = video_meta.get("t_cv_start_system")
+                sync_offset = video_meta.get("sync_offset")
+                
+                if video_start_time:
+                    print(f"[CV Processor] Found video start time: {video_start_time}")
+                if t_cv_start_system and sync_offset:
+                    print(f"[CV Processor] Found Master Clock sync info in imu_data.json")
             except Exception as e:
                 print(f"[CV Processor] Error reading imu_data.json: {e}")
                 pass
@@ -296,9 +391,10 @@ def main():
     processor.process_video(
         video_start_timestamp=video_start_time,
         t_cv_start_system=t_cv_start_system,
-        sync_offset=sync_offset
+        sync_offset=sync_offset,
+        workers=args.workers
     )
-    processor.save()
+    processor.save(pretty=args.pretty)
 
 
 if __name__ == "__main__":
@@ -4,7 +4,6 @@ Records raw IMU data and captures raw video for offline processing.
 This avoids real-time CV processing overhead and ensures high-quality trajectories.
 """
 
-import json
 import multiprocessing as mp
 import os
 import sys
@@ -21,16 +20,22 @@ sys.path.append(str(repo_root / "IMU"))
 
 # Try to import project modules
 try:
-    from app.monitor_ble import monitor_ble, StopCommand, get_sync_offset
+    from app.frame_ring import FrameRing
+    from app.imu_ring import IMU_DTYPE, ImuRing, load_imu_records, records_to_readings
+    from app.json_io import dump_json
+    from app.monitor_ble import monitor_ble_ring, StopCommand
+    from app.video_io import encode_frames, timestamps_path
 except ImportError as e:
     print(f"Import error: {e}")
     print("Ensure you are running this from the Code/IMU directory or paths are correct.")
     sys.exit(1)
 
 class RawDataRecorder:
-    def __init__(self, imu_output="outputs/imu_data.json", video_output="outputs/video.mp4"):
+    def __init__(self, imu_output="outputs/imu_data.json", video_output="outputs/video.mp4",
+                 embed_imu_json=False):
         self.imu_output = imu_output
         self.video_output = video_output
+        self.embed_imu_json = embed_imu_json
         self.data = {
             "metadata": {
                 "start_time": time.time(),
@@ -38,7 +43,6 @@ class RawDataRecorder:
                 "note": "Raw IMU and Video recording for offline processing",
                 "sync_info": {}
             },
-            "imu_readings": [],
             "video_metadata": {
                 "fps": 30,
                 "t_cv_start_system": 0,
@@ -46,50 +50,95 @@ class RawDataRecorder:
             }
         }
         self.should_stop = False
+
+        # IMU readings are appended to a binary file next to the JSON as they
+        # arrive, as fixed-size IMU_DTYPE records (load with np.fromfile), so memory
+        # use doesn't grow with the session length and saving has nothing left to
+        # serialize.
+        self._out_dir = Path(imu_output).parent
+        self._out_dir.mkdir(parents=True, exist_ok=True)
+        self._imu_stream_path = Path(imu_output).with_suffix(".imu.bin")
+        self._imu_stream = open(self._imu_stream_path, "wb", buffering=1 << 20)
+        self._n = 0
+        self._batch = None  # Record buffer for draining the IMU ring (sized on first use)
+
+        # Capture time (time.monotonic) of every video frame, so the offline
+        # processor does not have to assume a constant frame rate.
+        self._frame_ts = np.empty(200000, dtype=np.float64)
+        self._frame_count = 0
         
-    def record_imu(self, ble_queue):
+    def record_imu(self, imu_ring):
+        """Consume the ring until should_stop is set (runs in its own thread)."""
         print("[Recorder] IMU recording started.")
-        imu_count = 0
+        # Allocates the column buffers and loads the compiled drain kernel while the BLE
+        # process is still connecting, so the first readings don't wait on it
+        self._store_pending(imu_ring)
         while not self.should_stop:
-            try:
-                reading = ble_queue.get(timeout=0.1)
-                if hasattr(reading, "to_json"):
-                    reading_dict = reading.to_json()
-                else:
-                    reading_dict = {
-                        "accel": reading.accel.tolist(),
-                        "gyro": reading.gyro.tolist(),
-                        "t": reading.t,
-                        "pressure": reading.pressure
-                    }
-                # Store with absolute system timestamp for fallback/reference
-                reading_dict["local_timestamp"] = time.time()
-                self.data["imu_readings"].append(reading_dict)
-                
-                # Update metadata if offset was just established
-                if not self.data["metadata"]["sync_info"]:
-                    offset = get_sync_offset()
-                    if offset is not None:
-                        self.data["metadata"]["sync_info"] = {
-                            "offset": offset,
-                            "master_clock": "IMU_SENSOR"
-                        }
-                imu_count += 1
-                if imu_count % 100 == 0:
-                    print(f"[Recorder] IMU: received {imu_count} samples")
-            except mp.queues.Empty:
-                continue
-            except Exception as e:
-                print(f"[Recorder] IMU Error: {e}")
-
-    def save_imu(self):
-        self.data["metadata"]["end_time"] = time.time()
-        self.data["metadata"]["imu_count"] = len(self.data["imu_readings"])
+            # Sleep until the BLE process pushes readings (or main wakes us to stop)
+            imu_ring.wait()
+            self._store_pending(imu_ring)
+        # Keep whatever arrived before the stop
+        self._store_pending(imu_ring)
+
+    def _store_pending(self, imu_ring):
+        # Compiled copy straight out of the ring's shared memory into the fields of a
+        # record buffer (reused across batches), which also frees the slots
+        if self._batch is None:
+            self._batch = np.empty(imu_ring.capacity, dtype=IMU_DTYPE)
+        batch = self._batch
+        k = imu_ring.drain_into(batch["accel"], batch["gyro"], batch["t"], batch["pressure"], batch["local_ts"])
+        if k:
+            self._store_batch(k)
+
+        # Update metadata if offset was just established
+        if not self.data["metadata"]["sync_info"]:
+            offset = imu_ring.sync_offset
+            if offset is not None:
+                self.data["metadata"]["sync_info"] = {
+                    "offset": offset,
+                    "master_clock": "IMU_SENSOR"
+                }
+
+    def _store_batch(self, k):
+        n = self._n
+        self._imu_stream.write(self._batch[:k].data)
+        self._n = n + k
+
+        if self._n // 100 > n // 100:
+            print(f"[Recorder] IMU: received {self._n} samples")
+
+    def add_frame_timestamp(self, t):
+        if self._frame_count == self._frame_ts.shape[0]:
+            self._frame_ts = np.resize(self._frame_ts, 2 * self._frame_count)
+        self._frame_ts[self._frame_count] = t
+        self._frame_count += 1
+
+    def save_frame_timestamps(self):
+        ts_path = timestamps_path(self.video_output)
+        np.save(ts_path, self._frame_ts[:self._frame_count])
+        print(f"[Recorder] Frame timestamps saved to {ts_path}")
+
+    def save_imu(self, pretty=False):
+        self.data["metadata"].update({
+            "end_time": time.time(),
+            "imu_count": self._n,
+        })
         
-        os.makedirs(os.path.dirname(self.imu_output), exist_ok=True)
-        with open(self.imu_output, "w") as f:
-            json.dump(self.data, f, indent=2)
-        print(f"\n[Recorder] IMU data saved to {self.imu_output}")
+        # The readings are already on disk in the binary stream; the JSON only
+        # keeps the metadata and a reference to it.
+        self._imu_stream.close()
+        self.data["imu_file"] = {
+            "format": "records",
+            "file": self._imu_stream_path.name,
+            "record_size": IMU_DTYPE.itemsize,
+        }
+        if self.embed_imu_json:
+            self.data["imu_readings"] = records_to_readings(load_imu_records(self._imu_stream_path))
+
+        # Compact unless asked otherwise: pretty-printing tens of thousands of readings
+        # triples the file size and makes saving noticeably slower.
+        dump_json(self.data, self.imu_output, indent=pretty)
+        print(f"\n[Recorder] IMU data saved to {self.imu_output} (readings in {self._imu_stream_path.name})")
 
 def main():
     import argparse
@@ -97,61 +146,97 @@ def main():
     parser.add_argument("--imu", default="outputs/imu_data.json", help="Output IMU JSON file")
     parser.add_argument("--video", default="outputs/video.mp4", help="Output video file")
     parser.add_argument("--camera", type=int, default=0, help="Camera index")
+    parser.add_argument("--imu-json", action="store_true",
+                        help="Also embed the IMU readings in the JSON file (the binary .imu.bin stream is always written)")
+    parser.add_argument("--imu-core", type=int, default=None,
+                        help="Pin the BLE process, which timestamps the IMU readings, to this CPU core, with real-time priority if permitted (Linux)")
+    parser.add_argument("--encoder", default="auto", choices=["auto", "nvenc", "mp4v"],
+                        help="Video encoder: NVENC through ffmpeg (GPU) or OpenCV's mp4v (CPU); auto picks NVENC if available")
+    parser.add_argument("--pretty", action="store_true",
+                        help="Indent the output JSON (larger and slower to write, mostly useful with --imu-json)")
     args = parser.parse_args()
 
-    # Ensure output directory exists
-    Path(args.imu).parent.mkdir(parents=True, exist_ok=True)
+    # Ensure the video directory exists (the recorder creates the IMU one)
     Path(args.video).parent.mkdir(parents=True, exist_ok=True)
 
+    # SIMD code paths on; leave half the cores to the IMU thread and the encoder
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(max(1, (os.cpu_count() or 2) // 2))
+
     # Initialize Camera
     cap = cv2.VideoCapture(args.camera)
     if not cap.isOpened():
         print("Error: Could not open camera.")
         return
+    # Ask for MJPG: USB webcams otherwise send raw YUYV, which has to be converted on the
+    # CPU for every frame (and usually limits the frame rate at higher resolutions)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    # Keep at most one frame queued in the driver, so each read returns the freshest
+    # frame and its timestamp stays close to the exposure (not all backends support it)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
-    # Get camera properties
+    # Get camera properties (after the format request, drivers may change the resolution)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = 30  # Standard recording FPS
 
-    # Initialize Video Writer
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_out = cv2.VideoWriter(args.video, fourcc, fps, (width, height))
+    # Video is encoded in its own process (on the GPU when available), fed through a
+    # shared-memory frame ring, so a slow encode never delays the next capture
+    frame_ring = FrameRing((height, width, 3))
+    encoder_ready = mp.Event()
+    encoder_process = mp.Process(
+        target=encode_frames,
+        args=(frame_ring, args.video, fps, (width, height), args.encoder, encoder_ready),
+        daemon=True
+    )
+    encoder_process.start()
+    # Don't start capturing before the encoder can take frames (process startup can take a second)
+    encoder_ready.wait(timeout=10.0)
 
     # CRITICAL: Record the exact start time for both IMU and Video
     t_cv_start_system = time.monotonic()
     
-    recorder = RawDataRecorder(args.imu, args.video)
+    recorder = RawDataRecorder(args.imu, args.video, embed_imu_json=args.imu_json)
     recorder.data["video_metadata"]["fps"] = fps
     recorder.data["video_metadata"]["t_cv_start_system"] = t_cv_start_system
     
-    # Start BLE monitoring
-    ble_queue = mp.Queue()
+    # BLE monitoring runs in its own process and writes readings into a
+    # shared-memory ring buffer; the IMU recorder consumes it in a background
+    # thread, blocking on the ring's wake-up socket between batches.
+    imu_ring = ImuRing()
     ble_command_queue = mp.Queue()
-    ble_thread = threading.Thread(
-        target=monitor_ble, 
-        args=(ble_queue, ble_command_queue),
+    ble_process = mp.Process(
+        target=monitor_ble_ring,
+        args=(imu_ring, ble_command_queue, args.imu_core),
         daemon=True
     )
-    ble_thread.start()
-
-    # Start IMU recording thread
-    imu_rec_thread = threading.Thread(target=recorder.record_imu, args=(ble_queue,))
-    imu_rec_thread.start()
+    ble_process.start()
+    imu_thread = threading.Thread(target=recorder.record_imu, args=(imu_ring,), daemon=True)
+    imu_thread.start()
 
     print("\n=== Recording Started ===")
     print(f"Saving video to: {args.video}")
     print(f"Saving IMU data to: {args.imu}")
     print("Press 'q' in the camera window or Ctrl+C to stop recording\n")
 
+    # Reused capture buffer (cap.retrieve fills it in place when the size matches)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+
     try:
         while not recorder.should_stop:
-            ret, frame = cap.read()
+            # Timestamp at grab(), before the frame is decoded by retrieve(), so decode
+            # time doesn't show up as IMU/video offset
+            if not cap.grab():
+                break
+            t_frame = time.monotonic()
+            ret, frame = cap.retrieve(frame)
             if not ret:
                 break
 
-            # Save frame to video
-            video_out.write(frame)
+            # Hand the frame to the encoder; if it has fallen 4 frames behind this one is
+            # dropped, and so is its timestamp, so the timestamps still match the video
+            if frame_ring.put(frame):
+                recorder.add_frame_timestamp(t_frame)
 
             # Display preview
             cv2.putText(frame, "RECORDING...", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
@@ -163,21 +248,38 @@ def main():
         print("\n[Main] Stopping...")
     finally:
         recorder.should_stop = True
+        imu_ring.wake()
         
         # Cleanup
         ble_command_queue.put(StopCommand())
-        imu_rec_thread.join(timeout=1.0)
+        imu_thread.join(timeout=1.0)
+        ble_process.join(timeout=2.0)
+        if ble_process.is_alive():
+            # Still scanning for the pen, so it never read the StopCommand
+            ble_process.terminate()
         
         cap.release()
-        video_out.release()
         cv2.destroyAllWindows()
+        # Let the encoder finish the queued frames
+        frame_ring.finish()
+        encoder_process.join()
+        dropped_frames = frame_ring.dropped
+        frame_ring.close()
+        frame_ring.unlink()
+        recorder.data["video_metadata"]["dropped_frames"] = dropped_frames
+        if dropped_frames:
+            print(f"[Recorder] Warning: encoder fell behind, {dropped_frames} frames dropped")
         
         # Finalize sync info in video metadata before saving
-        offset = get_sync_offset()
+        offset = imu_ring.sync_offset
         if offset is not None:
             recorder.data["video_metadata"]["sync_offset"] = offset
+        recorder.data["metadata"]["imu_dropped"] = imu_ring.dropped
+        imu_ring.close()
+        imu_ring.unlink()
             
-        recorder.save_imu()
+        recorder.save_imu(pretty=args.pretty)
+        recorder.save_frame_timestamps()
         print(f"[Recorder] Video saved to {args.video}")
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from app import array_io
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(0)
+    return {
+        "R_cam": rng.normal(size=(20, 3, 3)).astype(np.float32),
+        "t": np.arange(20, dtype=np.float64),
+    }
+
+
+def check_round_trip(arrays, tmp_path):
+    manifest = array_io.save_arrays(arrays, tmp_path / "cv_data.json")
+    loaded = array_io.load_arrays(manifest, tmp_path)
+    assert loaded.keys() == arrays.keys()
+    for name, arr in arrays.items():
+        assert loaded[name].dtype == arr.dtype
+        np.testing.assert_array_equal(loaded[name], arr)
+    return manifest
+
+
+def test_round_trip_blosc(arrays, tmp_path):
+    pytest.importorskip("blosc")
+    manifest = check_round_trip(arrays, tmp_path)
+    assert manifest["format"] == "blosc"
+    assert (tmp_path / "cv_data.R_cam.blosc").exists()
+
+
+def test_round_trip_npz(arrays, tmp_path, monkeypatch):
+    # Without python-blosc everything goes into one .npz
+    monkeypatch.setattr(array_io, "blosc", None)
+    manifest = check_round_trip(arrays, tmp_path)
+    assert manifest == {"format": "npz", "file": "cv_data.npz"}
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        array_io.load_arrays({"format": "parquet"}, tmp_path)
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation
+
+from app import dodeca_bridge
+from app.dodeca_bridge import CENTER_TO_TIP_BODY, IMU_OFFSET_BODY, make_ekf_measurements
+
+
+@pytest.fixture
+def vision(monkeypatch):
+    """Stand-in for Computer_vision/run.py's published pose (object_pose + object_pose_seq)."""
+    run = SimpleNamespace(object_pose=None, object_pose_seq=0)
+    monkeypatch.setattr(dodeca_bridge, "dcv_run", run)
+    monkeypatch.setattr(dodeca_bridge, "_last_measurements", None)
+    monkeypatch.setattr(dodeca_bridge, "_prev_q", None)
+    return run
+
+
+def publish(run, tvec_mm, R):
+    run.object_pose = np.concatenate([tvec_mm, R.ravel()]).reshape(1, 12)
+    run.object_pose_seq += 1
+
+
+def test_no_pose(vision):
+    assert make_ekf_measurements() is None
+
+
+def test_measurements(vision):
+    R = Rotation.from_rotvec([0.2, -0.1, 0.3]).as_matrix()
+    publish(vision, np.array([10.0, -20.0, 400.0]), R)
+    m = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+    assert m["seq"] == 1
+    np.testing.assert_allclose(m["center_pos_cam"], [0.01, -0.02, 0.4])
+    np.testing.assert_allclose(m["tip_pos_cam"], m["center_pos_cam"] + R @ CENTER_TO_TIP_BODY)
+    np.testing.assert_allclose(m["R_cam"], R)
+    assert m["q_cam"][0] >= 0
+
+
+def test_same_seq_returns_cached_result(vision):
+    publish(vision, np.array([10.0, -20.0, 400.0]), np.eye(3))
+    first = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+    # The pose object changes but no new sequence number was published: the cached dict
+    # is returned without reading the pose again
+    vision.object_pose = vision.object_pose * 2
+    assert make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY) is first
+
+
+def test_new_seq_refreshes(vision):
+    publish(vision, np.array([10.0, -20.0, 400.0]), np.eye(3))
+    first = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+    publish(vision, np.array([30.0, 0.0, 500.0]), np.eye(3))
+    second = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+    assert second is not first
+    assert second["seq"] == 2
+    np.testing.assert_allclose(second["center_pos_cam"], [0.03, 0.0, 0.5])
+
+
+def test_other_offsets_are_not_served_from_cache(vision):
+    publish(vision, np.array([10.0, -20.0, 400.0]), np.eye(3))
+    first = make_ekf_measurements(CENTER_TO_TIP_BODY, IMU_OFFSET_BODY)
+    other_tip = np.array([0.0, 0.0, -0.1])
+    m = make_ekf_measurements(other_tip, IMU_OFFSET_BODY)
+    assert m is not first
+    np.testing.assert_allclose(m["tip_pos_cam"], m["center_pos_cam"] + other_tip)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.frame_ring import FrameRing
+
+SHAPE = (6, 8, 3)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(SHAPE, slots=4)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def frame(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def test_frames_in_order_with_wraparound(ring):
+    frames = ring.frames()
+    # 5 rounds of 3 frames through 4 slots: the slots wrap around several times
+    for round_ in range(5):
+        for k in range(3):
+            assert ring.put(frame(10 * round_ + k))
+        for k in range(3):
+            f = next(frames)
+            assert f.shape == SHAPE
+            assert np.all(f == 10 * round_ + k)
+    ring.finish()
+    assert next(frames, None) is None
+    assert ring.dropped == 0
+
+
+def test_drop_when_full(ring):
+    for k in range(4):
+        assert ring.put(frame(k))
+    assert not ring.put(frame(99))
+    assert ring.dropped == 1
+    ring.finish()
+    assert [int(f[0, 0, 0]) for f in ring.frames()] == [0, 1, 2, 3]
+
+
+def test_finish_without_frames(ring):
+    ring.finish()
+    assert list(ring.frames()) == []
+
+
+def test_slots_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        FrameRing(SHAPE, slots=3)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from app.imu_ring import IMU_DTYPE, ImuRing
+from app.monitor_ble import StylusReading
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(capacity):
+        ring = ImuRing(capacity)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.close()
+        ring.unlink()
+
+
+def reading(i):
+    return StylusReading((i, i + 0.5, -i), (0.25 * i, 0.0, 1.0), 10.0 * i, 0.5)
+
+
+def drain(ring, size=None):
+    out = np.zeros(size or ring.capacity, dtype=IMU_DTYPE)
+    n = ring.drain_into(out["accel"], out["gyro"], out["t"], out["pressure"], out["local_ts"])
+    return out[:n]
+
+
+def test_capacity_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        ImuRing(6)
+
+
+def test_put_and_drain_into(make_ring):
+    ring = make_ring(8)
+    for i in range(5):
+        ring.put(reading(i))
+    out = drain(ring)
+    assert len(out) == 5
+    np.testing.assert_array_equal(out["t"], 10.0 * np.arange(5))
+    np.testing.assert_array_equal(out["accel"][3], [3, 3.5, -3])
+    np.testing.assert_array_equal(out["gyro"][2], [0.5, 0, 1])
+    assert np.all(out["pressure"] == 0.5)
+    assert np.all(np.diff(out["local_ts"]) >= 0)
+    assert len(drain(ring)) == 0
+
+
+def test_wraparound(make_ring):
+    ring = make_ring(8)
+    for i in range(6):
+        ring.put(reading(i))
+    assert len(drain(ring)) == 6
+    # head and tail now sit at 6: the next 6 records wrap around the end of the ring
+    for i in range(6, 12):
+        ring.put(reading(i))
+    out = drain(ring)
+    np.testing.assert_array_equal(out["t"], 10.0 * np.arange(6, 12))
+    assert ring.dropped == 0
+
+
+def test_drop_counting(make_ring):
+    ring = make_ring(4)
+    for i in range(7):
+        ring.put(reading(i))
+    assert ring.dropped == 3
+    # The oldest readings are kept, the ones that found the ring full are lost
+    np.testing.assert_array_equal(drain(ring)["t"], 10.0 * np.arange(4))
+    ring.put(reading(7))
+    np.testing.assert_array_equal(drain(ring)["t"], [70.0])
+    assert ring.dropped == 3
+
+
+def test_drain_into_wrapped_tail(make_ring):
+    ring = make_ring(8)
+    for i in range(6):
+        ring.put(reading(i))
+    # Output smaller than the backlog: only the first 4 are taken, the rest stay pending
+    np.testing.assert_array_equal(drain(ring, 4)["t"], 10.0 * np.arange(4))
+    for i in range(6, 11):
+        ring.put(reading(i))
+    # Pending records 4..10 run from slot 4 past the end of the ring to slot 2
+    np.testing.assert_array_equal(drain(ring)["t"], 10.0 * np.arange(4, 11))
+    assert ring.dropped == 0
+
+
+def test_sync_offset(make_ring):
+    ring = make_ring(4)
+    assert ring.sync_offset is None
+    ring.set_sync_offset(-1.5)
+    assert ring.sync_offset == -1.5
@@ -0,0 +1,85 @@
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation
+
+from app.kernels import POSE_STATE_SIZE, mat2quat, new_pose_state, process_pose, quat2mat
+
+# The per-channel filter process_pose replaced (Computer_vision/src/filter.py)
+_spec = importlib.util.spec_from_file_location(
+    "cv_filter", Path(__file__).resolve().parents[2] / "Computer_vision" / "src" / "filter.py")
+cv_filter = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(cv_filter)
+OneEuroFilter = cv_filter.OneEuroFilter
+
+
+def wxyz(quat_xyzw):
+    return np.array([quat_xyzw[3], quat_xyzw[0], quat_xyzw[1], quat_xyzw[2]])
+
+
+def test_mat2quat_matches_scipy():
+    rotations = list(Rotation.random(500, random_state=0).as_matrix())
+    # Also one matrix for each branch of mat2quat: identity, and half turns about each axis
+    rotations += [np.eye(3)] + [Rotation.from_rotvec(np.pi * axis).as_matrix() for axis in np.eye(3)]
+    for R_mat in rotations:
+        expected = wxyz(Rotation.from_matrix(R_mat).as_quat())
+        np.testing.assert_allclose(mat2quat(R_mat), expected, rtol=0, atol=1e-12)
+
+
+def test_quat2mat_matches_scipy():
+    for quat_xyzw in Rotation.random(500, random_state=1).as_quat():
+        expected = Rotation.from_quat(quat_xyzw).as_matrix()
+        np.testing.assert_allclose(quat2mat(wxyz(quat_xyzw)), expected, rtol=0, atol=1e-12)
+
+
+def reference_poses(detections, tip_body, min_cutoff, beta):
+    """The processor's original per-detection code: scipy conversions and one OneEuroFilter per channel."""
+    filters = None
+    results = []
+    for t, R_cam, tvec in detections:
+        center = tvec / 1000.0
+        quat = wxyz(Rotation.from_matrix(R_cam).as_quat())
+        if filters is None:
+            filters = [OneEuroFilter(t, x, min_cutoff=min_cutoff, beta=beta) for x in (*center, *quat)]
+            filtered_center = center
+            filtered_R = R_cam
+        else:
+            filtered = np.array([f.filter_signal(t, x) for f, x in zip(filters, (*center, *quat))])
+            filtered_center = filtered[:3]
+            filtered_quat = filtered[3:] / np.linalg.norm(filtered[3:])
+            filtered_R = Rotation.from_quat(np.roll(filtered_quat, -1)).as_matrix()
+        results.append((filtered_center, filtered_center + filtered_R @ tip_body, filtered_R))
+    return results
+
+
+@pytest.mark.parametrize("min_cutoff, beta", [(1.0, 0.0), (0.5, 0.007)])
+def test_process_pose_matches_one_euro_filters(min_cutoff, beta):
+    rng = np.random.default_rng(2)
+    # A pen slowly turning and moving in front of the camera, with detection noise and jittered frame times
+    n = 120
+    t = np.cumsum(rng.uniform(0.025, 0.045, n))
+    rotvecs = np.linspace([0.2, -0.4, 0.1], [1.2, 0.3, -0.8], n) + rng.normal(scale=0.01, size=(n, 3))
+    tvecs = np.linspace([-50.0, 20.0, 400.0], [80.0, -30.0, 550.0], n) + rng.normal(scale=0.5, size=(n, 3))
+    detections = [(t[i], Rotation.from_rotvec(rotvecs[i]).as_matrix(), tvecs[i]) for i in range(n)]
+    tip_body = np.array([0.0, 0.0, -0.137])
+
+    state = new_pose_state()
+    assert state.shape == (POSE_STATE_SIZE,)
+    center, tip, R = np.empty(3), np.empty(3), np.empty((3, 3))
+    for (t_i, R_cam, tvec), expected in zip(detections, reference_poses(detections, tip_body, min_cutoff, beta)):
+        process_pose(R_cam, tvec, state, tip_body, t_i, True, center, tip, R, min_cutoff, beta)
+        for actual, wanted in zip((center, tip, R), expected):
+            np.testing.assert_allclose(actual, wanted, rtol=0, atol=1e-12)
+
+
+def test_process_pose_unfiltered():
+    R_cam = Rotation.from_rotvec([0.3, 0.2, -0.1]).as_matrix()
+    tvec = np.array([10.0, -20.0, 300.0])
+    tip_body = np.array([0.0, 0.0, -0.137])
+    center, tip, R = np.empty(3), np.empty(3), np.empty((3, 3))
+    process_pose(R_cam, tvec, new_pose_state(), tip_body, 0.0, False, center, tip, R)
+    np.testing.assert_array_equal(center, tvec / 1000.0)
+    np.testing.assert_array_equal(R, R_cam)
+    np.testing.assert_allclose(tip, tvec / 1000.0 + R_cam @ tip_body, rtol=0, atol=1e-15)
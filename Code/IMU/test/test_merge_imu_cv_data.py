@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.imu_ring import IMU_DTYPE
+from app.json_io import dump_json
+from merge_imu_cv_data import align_timestamps, load_imu_data
+
+
+def make_records(n):
+    records = np.zeros(n, dtype=IMU_DTYPE)
+    records["accel"] = np.arange(3 * n, dtype=np.float32).reshape(n, 3) / 4
+    records["gyro"] = -records["accel"]
+    records["t"] = 1000.0 + 10.0 * np.arange(n)
+    records["pressure"] = 0.5
+    records["local_ts"] = 1700000000.0 + 0.01 * np.arange(n)
+    return records
+
+
+def write_recording(tmp_path, records, **extra):
+    # Same layout as record_raw_data_filtered.py: metadata JSON + raw records next to it
+    records.tofile(tmp_path / "imu_data.imu.bin")
+    data = {
+        "metadata": {"imu_count": len(records)},
+        "imu_file": {"format": "records", "file": "imu_data.imu.bin", "record_size": IMU_DTYPE.itemsize},
+        **extra,
+    }
+    dump_json(data, tmp_path / "imu_data.json")
+    return tmp_path / "imu_data.json"
+
+
+def test_load_imu_data_records(tmp_path):
+    records = make_records(25)
+    data = load_imu_data(write_recording(tmp_path, records))
+    readings = data["imu_readings"]
+    assert data["metadata"]["imu_count"] == len(readings) == 25
+    for r, rec in zip(readings, records):
+        assert r["accel"] == rec["accel"].tolist()
+        assert r["gyro"] == rec["gyro"].tolist()
+        assert r["t"] == int(rec["t"]) and isinstance(r["t"], int)
+        assert r["pressure"] == 0.5
+        assert r["local_timestamp"] == rec["local_ts"]
+
+
+def test_load_imu_data_embedded_readings(tmp_path):
+    # Recorded with --imu-json: the embedded readings are used as-is
+    path = write_recording(tmp_path, make_records(3), imu_readings=[{"t": 1}])
+    assert load_imu_data(path)["imu_readings"] == [{"t": 1}]
+
+
+def test_load_imu_data_record_size_mismatch(tmp_path):
+    path = write_recording(tmp_path, make_records(3))
+    data = {"imu_file": {"format": "records", "file": "imu_data.imu.bin", "record_size": 40}}
+    dump_json(data, path)
+    with pytest.raises(ValueError):
+        load_imu_data(path)
+
+
+def test_load_imu_data_unknown_format(tmp_path):
+    path = write_recording(tmp_path, make_records(3))
+    dump_json({"imu_file": {"format": "ndjson", "file": "imu_data.imu.ndjson"}}, path)
+    with pytest.raises(ValueError):
+        load_imu_data(path)
+
+
+def align_timestamps_loop(readings, sync_offset, allow_negative=False, use_sensor_t=False):
+    """The per-reading loop align_timestamps replaced."""
+    aligned = []
+    for reading in readings:
+        if use_sensor_t and "t" in reading:
+            t_src = reading["t"] / 1000.0
+        else:
+            t_src = reading["local_timestamp"]
+        if allow_negative or t_src >= sync_offset:
+            aligned_reading = reading.copy()
+            aligned_reading["timestamp"] = t_src - sync_offset
+            aligned_reading["local_timestamp"] = t_src - sync_offset
+            aligned.append(aligned_reading)
+    return aligned
+
+
+@pytest.mark.parametrize("allow_negative", [False, True])
+@pytest.mark.parametrize("use_sensor_t", [False, True])
+def test_align_timestamps_matches_loop(allow_negative, use_sensor_t):
+    rng = np.random.default_rng(1)
+    readings = [
+        {"accel": [0.0, 0.0, 9.8], "t": int(t), "local_timestamp": float(lt)}
+        for t, lt in zip(rng.integers(0, 20000, 200), rng.uniform(0, 20, 200))
+    ]
+    # Readings without a sensor clock fall back to local_timestamp
+    for r in readings[::7]:
+        del r["t"]
+    expected = align_timestamps_loop(readings, 7.3, allow_negative, use_sensor_t)
+    assert align_timestamps(readings, 7.3, allow_negative, use_sensor_t) == expected
+
+
+def test_align_timestamps_empty():
+    assert align_timestamps([], 0.0) == []
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from process_video_to_cv_data import OfflineCVProcessor
+
+N_FRAMES = 10
+FPS = 30
+
+
+@pytest.fixture
+def processor(tmp_path):
+    video = tmp_path / "take2.mp4"
+    video.touch()  # Only its path is used here
+    return OfflineCVProcessor(video, output_file=tmp_path / "cv_data.json")
+
+
+def recorded_timestamps(n=N_FRAMES):
+    # Jittered capture times (time.monotonic) with one dropped frame
+    ts = 100.0 + np.arange(n) / FPS + np.linspace(0, 0.004, n)
+    ts[6:] += 1 / FPS
+    return ts
+
+
+def test_without_recorded_timestamps(processor):
+    frame_numbers = np.arange(1, N_FRAMES + 1)
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, None, None),
+                               5000.0 + frame_numbers / FPS)
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, 100.0, 2.5),
+                               100.0 + frame_numbers / FPS + 2.5)
+    assert "frame_timestamps" not in processor.data["metadata"]
+
+
+def test_recorded_timestamps(processor, tmp_path):
+    ts = recorded_timestamps()
+    np.save(tmp_path / "take2.timestamps.npy", ts)
+    # Master clock: capture times shifted into the sensor clock
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, 100.0, 2.5), ts + 2.5)
+    # No sync offset: relative to the recording start, on the video start timestamp
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, 100.0, None),
+                               5000.0 + (ts - 100.0))
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, None, None),
+                               5000.0 + (ts - ts[0]))
+    assert processor.data["metadata"]["frame_timestamps"] == str(tmp_path / "take2.timestamps.npy")
+
+
+def test_length_mismatch_is_ignored(processor, tmp_path):
+    np.save(tmp_path / "take2.timestamps.npy", recorded_timestamps(N_FRAMES - 3))
+    expected = 5000.0 + np.arange(1, N_FRAMES + 1) / FPS
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, None, None), expected)
+    assert "frame_timestamps" not in processor.data["metadata"]
+
+
+def test_other_recordings_timestamps_are_not_used(processor, tmp_path):
+    # Another take in the same directory: its sidecar is named after its own video
+    np.save(tmp_path / "video.timestamps.npy", recorded_timestamps())
+    expected = 5000.0 + np.arange(1, N_FRAMES + 1) / FPS
+    np.testing.assert_allclose(processor._frame_timestamps(N_FRAMES, FPS, 5000.0, None, None), expected)
@@ -0,0 +1,46 @@
+import multiprocessing as mp
+import time
+
+import cv2
+import numpy as np
+
+from app.frame_ring import FrameRing
+from app.video_io import encode_frames
+
+WIDTH, HEIGHT = 64, 48
+
+
+def run_encoder(path, frames):
+    """Run encode_frames in its own process (as the recorder does) on `frames`; returns its exit code."""
+    ring = FrameRing((HEIGHT, WIDTH, 3))
+    ready = mp.Event()
+    process = mp.Process(target=encode_frames, args=(ring, str(path), 30, (WIDTH, HEIGHT), "mp4v", ready))
+    process.start()
+    try:
+        assert ready.wait(timeout=30)
+        for f in frames:
+            # Retry while the encoder is behind: here every frame has to reach the file
+            while not ring.put(f):
+                time.sleep(0.001)
+        ring.finish()
+        process.join(timeout=30)
+        return process.exitcode
+    finally:
+        if process.is_alive():
+            process.terminate()
+        ring.close()
+        ring.unlink()
+
+
+def test_encode_frames(tmp_path):
+    path = tmp_path / "video.mp4"
+    frames = [np.full((HEIGHT, WIDTH, 3), 20 * k, dtype=np.uint8) for k in range(6)]
+    assert run_encoder(path, frames) == 0
+    cap = cv2.VideoCapture(str(path))
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == len(frames)
+    cap.release()
+
+
+def test_encode_frames_without_frames(tmp_path):
+    # finish() before any frame (e.g. the first grab() failed): the encoder still exits cleanly
+    assert run_encoder(tmp_path / "video.mp4", []) == 0
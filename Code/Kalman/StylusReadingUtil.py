@@ -1,4 +1,5 @@
 from monitor_ble import monitor_ble, live_plot
+from reading_ring import ReadingRing
 import multiprocessing as mp
 from pynput import keyboard
 import matplotlib.pyplot as plt
@@ -6,26 +7,26 @@ from time import sleep, time
 
 # Global variables
 ble_process = None
-ble_queue = mp.Queue()
 ble_command_queue = mp.Queue()
 
 plot_process = None
 
-# Initialize data queues
-phi_queue = mp.Queue() 
-theta_queue = mp.Queue()
+# Shared-memory ring carrying readings and filtered angles from the BLE process to the plot
+reading_ring = None
     
 def start_ble_process():
     global ble_process
     global plot_process
+    global reading_ring
     
+    reading_ring = ReadingRing()
     ble_process = mp.Process(
-        target=monitor_ble, args=(ble_queue, ble_command_queue, phi_queue, theta_queue), daemon=False
+        target=monitor_ble, args=(reading_ring, ble_command_queue), daemon=False
     )
     ble_process.start()
     print("BLE process started.")
     
-    plot_process = mp.Process(target=live_plot, args=(phi_queue, theta_queue))
+    plot_process = mp.Process(target=live_plot, args=(reading_ring,))
     plot_process.start()
     print("Plot process started.")
 
@@ -33,6 +34,7 @@ def stop_processes():
     """Terminate both processes and wait for them to finish."""
     global ble_process
     global plot_process
+    global reading_ring
 
     if plot_process:
         print("Terminating plot process...")
@@ -45,6 +47,11 @@ def stop_processes():
         ble_process.terminate()
         ble_process.join()
         print("BLE process terminated.")
+
+    if reading_ring:
+        reading_ring.close()
+        reading_ring.unlink()
+        reading_ring = None
         
 def on_press(key):
     try:
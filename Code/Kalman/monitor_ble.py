@@ -6,10 +6,11 @@ import asyncio
 import multiprocessing as mp
 import math
 from math import sin, cos, tan
-from time import sleep, time
+from time import time
 import matplotlib.pyplot as plt
 
 import numpy as np
+from numba import njit
 
 class StylusReading(NamedTuple):
     accel: np.ndarray
@@ -41,69 +42,176 @@ class StopCommand(NamedTuple):
     pass
 
 
-def calc_accel(a):
-    """Remap raw accelerometer measurements to Gs."""
-    accel_range = 4  # Should match settings.accelRange in microcontroller code
-    return a * 0.061 * (accel_range / 2) / 1000
+# Raw accelerometer counts -> m/s^2
+ACCEL_RANGE = 4  # Should match settings.accelRange in microcontroller code
+ACC_K = 0.061 * (ACCEL_RANGE / 2) / 1000 * 9.8
 
-
-def calc_gyro(g):
-    """Remap raw gyro measurements to degrees per second."""
-    gyro_range = 500  # Should match settings.gyroRange in microcontroller code
-    return g * 4.375 * (gyro_range / 125) / 1000
+# Raw gyro counts -> rad/s
+GYRO_RANGE = 500  # Should match settings.gyroRange in microcontroller code
+GYR_K = 4.375 * (GYRO_RANGE / 125) / 1000 * math.pi / 180.0
 
 def unpack_imu_data_packet(data: bytearray):
     """Unpacks an IMUDataPacket struct from the given data buffer."""
     #-ay, ax, -az, gy, -gx, gz, pressure = struct.unpack("<3h3hH", data)
     ay, ax, az, gy, gx, gz, pressure = struct.unpack("<3h3hH", data)
-    ay = -ay
-    az = -az
-    gx = -gx
-    accel = calc_accel(np.array([ax, ay, az], dtype=np.float64) * 9.8)
-    gyro = calc_gyro(np.array([gx, gy, gz], dtype=np.float64) * np.pi / 180.0)
-
-    print(accel)
+    # Scale (and flip axes) as plain floats, then build each array once
+    accel = np.array((ax * ACC_K, -ay * ACC_K, -az * ACC_K))
+    gyro = np.array((-gx * GYR_K, gy * GYR_K, gz * GYR_K))
 
     return StylusReading(accel, gyro, 0, pressure / 2**16)
 
 
 characteristic = "19B10013-E8F2-537E-4F6C-D104768A1214"
 
-sleep_time = 0.01
-
-# Initialise matrices and variables
-C = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])
-P = np.eye(4)
-Q = np.eye(4)
-R = np.eye(2)
-
-state_estimate = np.array([[0], [0], [0], [0]]) # [phi_hat, phi_dot, theta_hat, theta_dot]
-
-phi_hat = 0.0
-theta_hat = 0.0
+# Print the angles for every PRINT_EVERY-th packet only
+PRINT_EVERY = 50
 
-# Calculate accelerometer offsets
-N = 100
+# Accelerometer angle offsets (not calibrated yet)
 phi_offset = 0.0
 theta_offset = 0.0
 
-for i in range(N):
-    [phi_acc, theta_acc] = [0,0] 
-    phi_offset += phi_acc
-    theta_offset += theta_acc
-    sleep(sleep_time)
 
-phi_offset = float(phi_offset) / float(N)
-theta_offset = float(theta_offset) / float(N)
-
-sleep(2)
-
-# Measured sampling time
-dt = 0.0
-start_time = time()
+def new_kalman_scratch():
+    """
+    Scratch buffer for kalman_step: one (4, 15) array whose column blocks hold x (1),
+    A P (4), P_pred (4), P_pred C^T (2) and K (2). A single array rather than a tuple
+    keeps the per-call argument unboxing cheap.
+    """
+    return np.empty((4, 15))
+
+
+@njit(cache=True, fastmath=True)
+def kalman_step(state, P, A, B, C, Q, R, phi_dot, theta_dot, phi_acc, theta_acc, scratch):
+    """
+    One predict/update step of the roll/pitch Kalman filter, with the matrix products
+    written out as loops over the fixed 4x4 / 4x2 / 2x2 shapes.
+    Updates `state` (4,) and `P` (4,4) in place. Intermediates go into the preallocated
+    `scratch` buffer (see new_kalman_scratch), so a step allocates nothing.
+    """
+    x = scratch[:, 0]
+    AP = scratch[:, 1:5]
+    P_pred = scratch[:, 5:9]
+    PCt = scratch[:, 9:11]
+    K = scratch[:, 11:13]
+
+    # Predict: x = A state + B [phi_dot, theta_dot], P_pred = A P A^T + Q
+    for i in range(4):
+        acc = B[i, 0] * phi_dot + B[i, 1] * theta_dot
+        for k in range(4):
+            acc += A[i, k] * state[k]
+        x[i] = acc
+        for j in range(4):
+            acc = 0.0
+            for k in range(4):
+                acc += A[i, k] * P[k, j]
+            AP[i, j] = acc
+    for i in range(4):
+        for j in range(4):
+            acc = Q[i, j]
+            for k in range(4):
+                acc += AP[i, k] * A[j, k]
+            P_pred[i, j] = acc
+
+    # Innovation y = [phi_acc, theta_acc] - C x and its covariance S = R + C P_pred C^T
+    for i in range(4):
+        for m in range(2):
+            acc = 0.0
+            for k in range(4):
+                acc += P_pred[i, k] * C[m, k]
+            PCt[i, m] = acc
+    y0 = phi_acc
+    y1 = theta_acc
+    s00, s01, s10, s11 = R[0, 0], R[0, 1], R[1, 0], R[1, 1]
+    for k in range(4):
+        y0 -= C[0, k] * x[k]
+        y1 -= C[1, k] * x[k]
+        s00 += C[0, k] * PCt[k, 0]
+        s01 += C[0, k] * PCt[k, 1]
+        s10 += C[1, k] * PCt[k, 0]
+        s11 += C[1, k] * PCt[k, 1]
+
+    # Gain K = P_pred C^T S^-1 (closed-form 2x2 inverse), then the update
+    det = s00 * s11 - s01 * s10
+    for i in range(4):
+        K[i, 0] = (PCt[i, 0] * s11 - PCt[i, 1] * s10) / det
+        K[i, 1] = (PCt[i, 1] * s00 - PCt[i, 0] * s01) / det
+        state[i] = x[i] + K[i, 0] * y0 + K[i, 1] * y1
+    # P = (I - K C) P_pred
+    for i in range(4):
+        for j in range(4):
+            acc = P_pred[i, j]
+            for k in range(4):
+                acc -= (K[i, 0] * C[0, k] + K[i, 1] * C[1, k]) * P_pred[k, j]
+            P[i, j] = acc
+
+
+class StylusFilter:
+    """
+    State of the roll/pitch Kalman filter run in the BLE callback, kept together in one
+    object (attribute slots) rather than in module globals.
+    """
+    __slots__ = ("P", "state", "phi_hat", "theta_hat", "counter", "start_time",
+                 "A", "B", "C", "Q", "R", "scratch")
+
+    def __init__(self):
+        self.C = np.array([[1.0, 0, 0, 0], [0, 0, 1.0, 0]])
+        self.P = np.eye(4)
+        self.Q = np.eye(4)
+        self.R = np.eye(2)
+        # State transition and input matrices; their dt entries are updated in place for each sample
+        self.A = np.eye(4)  # [[1, -dt, 0, 0], [0, 1, 0, 0], [0, 0, 1, -dt], [0, 0, 0, 1]]
+        self.B = np.zeros((4, 2))  # [[dt, 0], [0, 0], [0, dt], [0, 0]]
+        self.state = np.zeros(4)  # [phi_hat, phi_dot, theta_hat, theta_dot]
+        self.scratch = new_kalman_scratch()
+        self.phi_hat = 0.0
+        self.theta_hat = 0.0
+        self.counter = 0
+        # Measured sampling time
+        self.start_time = time()
+
+    def warm_up(self):
+        """Compile (or load from cache) the filter step, on throwaway state."""
+        kalman_step(np.zeros(4), np.eye(4), np.eye(4), np.zeros((4, 2)), self.C, self.Q, self.R,
+                    0.0, 0.0, 0.0, 0.0, self.scratch)
+
+    def update(self, reading, now):
+        """Filter one reading taken at `now` (time()); returns (phi, theta) in degrees."""
+        dt = now - self.start_time
+        self.start_time = now
+
+        ax, ay, az = reading.accel
+        p, q, r = reading.gyro
+        # Get accelerometer measurements and remove offsets
+        phi_acc = math.atan2(ay, math.sqrt(ax ** 2.0 + az ** 2.0)) - phi_offset
+        theta_acc = math.atan2(-ax, math.sqrt(ay ** 2.0 + az ** 2.0)) - theta_offset
+        
+        # Get gyro measurements and calculate Euler angle derivatives gx, gy, gz
+        sin_phi = math.sin(self.phi_hat)
+        cos_phi = math.cos(self.phi_hat)
+        tan_theta = math.tan(self.theta_hat)
+        phi_dot = p + (sin_phi * q + cos_phi * r) * tan_theta
+        theta_dot = cos_phi * q - sin_phi * r
+
+        # Kalman filter
+        A = self.A
+        B = self.B
+        A[0, 1] = A[2, 3] = -dt
+        B[0, 0] = B[2, 1] = dt
+        state = self.state
+        kalman_step(state, self.P, A, B, self.C, self.Q, self.R, phi_dot, theta_dot, phi_acc, theta_acc,
+                    self.scratch)
+
+        self.phi_hat = state[0]
+        self.theta_hat = state[2]
+        return np.round(self.phi_hat * 180.0 / math.pi, 2), np.round(self.theta_hat * 180.0 / math.pi, 2)
+
+
+async def monitor_ble_async(reading_ring, command_queue: mp.Queue):
+    """Filter BLE readings and publish them, with the angles, to `reading_ring` (reading_ring.ReadingRing)."""
+    flt = StylusFilter()
+    # Compile (or load from cache) the filter step before the first notification arrives
+    flt.warm_up()
 
-counter = 0
-async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue, phi_queue: mp.Queue, theta_queue: mp.Queue):    
     while True:
         device = await BleakScanner.find_device_by_name("DPOINT", timeout=5)
         if device is None:
@@ -113,65 +221,16 @@ async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue, phi_q
         
         def queue_notification_handler(_: BleakGATTCharacteristic, data: bytearray):
             reading = unpack_imu_data_packet(data)
-            data_queue.put(reading)
-
-            # Sampling time
-            global start_time
-            global phi_hat
-            global theta_hat
-            global state_estimate
-            global P
-            global counter          
-
-            dt = time() - start_time
-            start_time = time()
-
-            ax = reading.accel[0]
-            ay = reading.accel[1]
-            az = reading.accel[2]
-            p = reading.gyro[0]
-            q = reading.gyro[1]
-            r = reading.gyro[2]
-            # Get accelerometer measurements and remove offsets
-            [phi_acc, theta_acc] = [math.atan2(ay, math.sqrt(ax ** 2.0 + az ** 2.0)), math.atan2(-ax, math.sqrt(ay ** 2.0 + az ** 2.0))] 
-            phi_acc -= phi_offset
-            theta_acc -= theta_offset
-            
-            # Get gyro measurements and calculate Euler angle derivatives gx, gy, gz
-            phi_dot = p + math.sin(phi_hat) * math.tan(theta_hat) * q + math.cos(phi_hat) * math.tan(theta_hat) * r
-            theta_dot = math.cos(phi_hat) * q - math.sin(phi_hat) * r
-
-            # Kalman filter
-            A = np.array([[1, -dt, 0, 0], [0, 1, 0, 0], [0, 0, 1, -dt], [0, 0, 0, 1]])
-            B = np.array([[dt, 0], [0, 0], [0, dt], [0, 0]])
-
-            gyro_input = np.array([[phi_dot], [theta_dot]])
-            state_estimate = A.dot(state_estimate) + B.dot(gyro_input)
-            P = A.dot(P.dot(np.transpose(A))) + Q
-
-            measurement = np.array([[phi_acc], [theta_acc]])
-            y_tilde = measurement - C.dot(state_estimate)
-            S = R + C.dot(P.dot(np.transpose(C)))
-            K = P.dot(np.transpose(C).dot(np.linalg.inv(S)))
-            state_estimate = state_estimate + K.dot(y_tilde)
-            P = (np.eye(4) - K.dot(C)).dot(P)
-
-            phi_hat = state_estimate[0]
-            theta_hat = state_estimate[2]
-            
-            phi_degrees = np.round(phi_hat * 180.0 / math.pi, 2)
-            theta_degrees = np.round(theta_hat * 180.0 / math.pi, 2)
+            now = time()
+            phi_degrees, theta_degrees = flt.update(reading, now)
             
-            # Enqueue the data for plotting
-            if counter%2 == 0:
-                phi_queue.put(phi_degrees)
-                theta_queue.put(theta_degrees)
-            counter += 1
+            # Publish the reading and angles (for plotting) through shared memory
+            reading_ring.put(reading.accel, reading.gyro, now, reading.pressure, phi_degrees, theta_degrees)
 
-            # Display results
-            # print("Phi: " + str(phi_degrees) + " Theta: " + str(theta_degrees))
-
-            sleep(sleep_time)
+            # Display results, rate-limited: printing every packet stalls the BLE callback
+            if flt.counter % PRINT_EVERY == 0:
+                print(f"Phi: {phi_degrees} Theta: {theta_degrees} a={reading.accel}")
+            flt.counter += 1
 
         disconnected_event = asyncio.Event()
         print("Connecting to BLE device...")
@@ -198,16 +257,42 @@ async def monitor_ble_async(data_queue: mp.Queue, command_queue: mp.Queue, phi_q
             await asyncio.sleep(1)
 
 
-def monitor_ble(data_queue: mp.Queue, command_queue: mp.Queue, phi_queue: mp.Queue, theta_queue: mp.Queue):
-    asyncio.run(monitor_ble_async(data_queue, command_queue, phi_queue, theta_queue))
+def monitor_ble(reading_ring, command_queue: mp.Queue):
+    asyncio.run(monitor_ble_async(reading_ring, command_queue))
     
+# Plot refresh interval (s); readings are drained from the ring in between
+PLOT_INTERVAL = 0.05
+
+
+def _expand_limits(ax, x_last, y_new):
+    """
+    Grow the axes limits to fit new data: the x range doubles and the y range gains a
+    margin of a quarter of its size, so full redraws stay rare. Returns True if they changed.
+    """
+    changed = False
+    x0, x1 = ax.get_xlim()
+    if x_last > x1:
+        while x_last > x1:
+            x1 *= 2
+        ax.set_xlim(x0, x1)
+        changed = True
+    y0, y1 = ax.get_ylim()
+    lo, hi = min(y_new), max(y_new)
+    if lo < y0 or hi > y1:
+        margin = max(5.0, 0.25 * (y1 - y0))
+        ax.set_ylim(min(y0, lo - margin), max(y1, hi + margin))
+        changed = True
+    return changed
+
+
 # Function to update the plot
-def live_plot(phi_queue, theta_queue):
+def live_plot(reading_ring):
     plt.ion()  # Turn on interactive mode
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
     x_data, phi_data, theta_data = [], [], []
-    line1, = ax1.plot(x_data, phi_data, label="Pitch (Theta)", color="blue")
-    line2, = ax2.plot(x_data, theta_data, label="Roll (Phi)", color="red")
+    # Animated lines are left out of full redraws and blitted over the cached backgrounds
+    line1, = ax1.plot(x_data, phi_data, label="Pitch (Theta)", color="blue", animated=True)
+    line2, = ax2.plot(x_data, theta_data, label="Roll (Phi)", color="red", animated=True)
     
     ax1.set_title("Phi (Roll Angle) vs Time")
     ax1.set_ylabel("Phi (degrees)")
@@ -220,32 +305,56 @@ def live_plot(phi_queue, theta_queue):
     ax2.legend()
     ax2.grid(True)
     
+    for ax in (ax1, ax2):
+        ax.set_xlim(0, 10)
+        ax.set_ylim(-5, 5)
+    
+    backgrounds = {}
+    
+    def blit_lines():
+        for ax, line in ((ax1, line1), (ax2, line2)):
+            fig.canvas.restore_region(backgrounds[ax])
+            ax.draw_artist(line)
+            fig.canvas.blit(ax.bbox)
+    
+    def on_draw(_event):
+        # Full redraw (first show, resize, new limits): re-cache the static parts
+        backgrounds[ax1] = fig.canvas.copy_from_bbox(ax1.bbox)
+        backgrounds[ax2] = fig.canvas.copy_from_bbox(ax2.bbox)
+        blit_lines()
+    
+    fig.canvas.mpl_connect("draw_event", on_draw)
+    plt.show(block=False)
+    fig.canvas.draw()
+    
     start_time = time()
+    last_draw = 0.0
+    drawn = 0  # Readings already reflected in the axes limits
     
     while True:
         try:
-            current_time = time() - start_time
-            if not phi_queue.empty() and not theta_queue.empty():
-                phi = phi_queue.get()
-                theta = theta_queue.get()
-                
-                x_data.append(current_time)
-                phi_data.append(phi)
-                theta_data.append(theta)
-                
-                line1.set_xdata(x_data)
-                line1.set_ydata(phi_data)
-                line2.set_xdata(x_data)
-                line2.set_ydata(theta_data)
-                
-                ax1.set_xlim(0, max(current_time, 10))
-                ax2.set_xlim(0, max(current_time, 10))
-                
-                ax1.set_ylim(min(phi_data)-5, max(phi_data)+5)
-                ax2.set_ylim(min(theta_data)-5, max(theta_data)+5)
-                
-                plt.pause(0.01)
+            batch = reading_ring.drain()
+            if len(batch) > 0:
+                x_data.extend((batch["t"] - start_time).tolist())
+                phi_data.extend(batch["phi"].tolist())
+                theta_data.extend(batch["theta"].tolist())
+            
+            now = time()
+            if len(x_data) > drawn and now - last_draw >= PLOT_INTERVAL:
+                last_draw = now
+                line1.set_data(x_data, phi_data)
+                line2.set_data(x_data, theta_data)
+                # Full redraw only when the limits have to grow, otherwise just blit the lines
+                grew1 = _expand_limits(ax1, x_data[-1], phi_data[drawn:])
+                grew2 = _expand_limits(ax2, x_data[-1], theta_data[drawn:])
+                drawn = len(x_data)
+                if grew1 or grew2:
+                    fig.canvas.draw()
+                else:
+                    blit_lines()
+            
+            fig.canvas.start_event_loop(0.01)
         except KeyboardInterrupt:
             print("Stopping live plot...")
             plt.close(fig)
-            break
\ No newline at end of file
+            break
@@ -1,8 +1,12 @@
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 import os
+import sys
+
+# The recorder's output is read through the merge script's loader (Code/IMU)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "IMU"))
+from merge_imu_cv_data import load_imu_data
 
 # Constants for Kalman Filter (matching monitor_ble.py)
 C = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])
@@ -14,10 +18,9 @@ R = np.eye(2) * 0.1   # Measurement noise
 GZ_BIAS = -0.018  # Corrects yaw drift observed when pen is stationary
 
 def process_imu_data(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-    
-    readings = data['imu_readings']
+    # Readings live in the .imu.bin file next to the JSON unless recorded with --imu-json
+    data = load_imu_data(json_path)
+    readings = data.get('imu_readings')
     
     if not readings or len(readings) == 0:
         print(f"Error: No IMU readings found in {json_path}")
@@ -0,0 +1,36 @@
+# reading_ring.py — shared-memory ring of filtered IMU readings for the Kalman demo.
+#
+# Replaces the mp.Queues between the BLE process and the plot process: each reading (and the
+# filter's phi/theta for it) is written as a fixed-layout record into a ShmRing (the
+# recorder's shared-memory ring core, Code/IMU/app/shm_ring.py) instead of being pickled
+# through a pipe. The plot process polls it with drain().
+#
+# Create the ring in the parent and pass it to the child processes as a Process argument;
+# they attach to the same segment by name.
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "IMU"))
+from app.shm_ring import ShmRing
+
+READING_DTYPE = np.dtype([
+    ("accel", "<f4", (3,)),
+    ("gyro", "<f4", (3,)),
+    ("t", "<f8"),  # Wall-clock time (s) of the reading
+    ("pressure", "<f4"),
+    ("phi", "<f4"),  # Filtered roll (degrees)
+    ("theta", "<f4"),  # Filtered pitch (degrees)
+])
+
+
+class ReadingRing(ShmRing):
+    def __init__(self, capacity=4096):
+        """Create a ring for `capacity` readings (a power of two)."""
+        super().__init__(READING_DTYPE, capacity)
+
+    def put(self, accel, gyro, t, pressure, phi, theta):
+        """Producer side. Readings are dropped (and counted) while the ring is full."""
+        return super().put((accel, gyro, t, pressure, phi, theta))
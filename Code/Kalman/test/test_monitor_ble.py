@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+import pytest
+
+from monitor_ble import StylusFilter, StylusReading, kalman_step, new_kalman_scratch
+
+C = np.array([[1.0, 0, 0, 0], [0, 0, 1.0, 0]])
+
+
+def reference_step(state_estimate, P, Q, R, dt, phi_dot, theta_dot, phi_acc, theta_acc):
+    """The callback's original NumPy filter step, on (4, 1) column states."""
+    A = np.array([[1, -dt, 0, 0], [0, 1, 0, 0], [0, 0, 1, -dt], [0, 0, 0, 1]])
+    B = np.array([[dt, 0], [0, 0], [0, dt], [0, 0]])
+
+    gyro_input = np.array([[phi_dot], [theta_dot]])
+    state_estimate = A.dot(state_estimate) + B.dot(gyro_input)
+    P = A.dot(P.dot(np.transpose(A))) + Q
+
+    measurement = np.array([[phi_acc], [theta_acc]])
+    y_tilde = measurement - C.dot(state_estimate)
+    S = R + C.dot(P.dot(np.transpose(C)))
+    K = P.dot(np.transpose(C).dot(np.linalg.inv(S)))
+    state_estimate = state_estimate + K.dot(y_tilde)
+    P = (np.eye(4) - K.dot(C)).dot(P)
+    return state_estimate, P
+
+
+@pytest.mark.parametrize("noise", [1.0, 0.01])
+def test_kalman_step_matches_matrix_code(noise):
+    rng = np.random.default_rng(0)
+    Q = np.eye(4) * noise
+    R = np.eye(2) * 0.1
+    expected_state, expected_P = np.zeros((4, 1)), np.eye(4)
+    state, P = np.zeros(4), np.eye(4)
+    A, B = np.eye(4), np.zeros((4, 2))
+    scratch = new_kalman_scratch()
+    for _ in range(500):
+        dt = rng.uniform(0.005, 0.02)
+        phi_dot, theta_dot, phi_acc, theta_acc = rng.normal(scale=0.5, size=4)
+        expected_state, expected_P = reference_step(expected_state, expected_P, Q, R, dt,
+                                                    phi_dot, theta_dot, phi_acc, theta_acc)
+        A[0, 1] = A[2, 3] = -dt
+        B[0, 0] = B[2, 1] = dt
+        kalman_step(state, P, A, B, C, Q, R, phi_dot, theta_dot, phi_acc, theta_acc, scratch)
+        np.testing.assert_allclose(state, expected_state[:, 0], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(P, expected_P, rtol=0, atol=1e-12)
+
+
+def test_kalman_step_scratch_holds_no_state():
+    # One scratch buffer, shared by two interleaved filters and left full of NaNs, must give
+    # the same results as a fresh buffer per step: every step overwrites what it reads
+    rng = np.random.default_rng(2)
+    Q, R = np.eye(4), np.eye(2)
+    A, B = np.eye(4), np.zeros((4, 2))
+    shared = new_kalman_scratch()
+    assert shared.shape == (4, 15)
+    shared.fill(np.nan)
+    states = [(np.zeros(4), np.eye(4)) for _ in range(2)]
+    fresh_states = [(np.zeros(4), np.eye(4)) for _ in range(2)]
+    for _ in range(100):
+        dt = rng.uniform(0.005, 0.02)
+        A[0, 1] = A[2, 3] = -dt
+        B[0, 0] = B[2, 1] = dt
+        for (state, P), (fresh_state, fresh_P) in zip(states, fresh_states):
+            inputs = rng.normal(scale=0.5, size=4)
+            kalman_step(state, P, A, B, C, Q, R, *inputs, shared)
+            kalman_step(fresh_state, fresh_P, A, B, C, Q, R, *inputs, new_kalman_scratch())
+            np.testing.assert_array_equal(state, fresh_state)
+            np.testing.assert_array_equal(P, fresh_P)
+
+
+def test_stylus_filter_matches_callback_math():
+    rng = np.random.default_rng(1)
+    flt = StylusFilter()
+    t = flt.start_time
+    state_estimate, P = np.zeros((4, 1)), np.eye(4)
+    phi_hat = theta_hat = 0.0
+    for _ in range(300):
+        # Sample time as the filter sees it: a difference of two time() values
+        t_prev, t = t, t + rng.uniform(0.005, 0.02)
+        dt = t - t_prev
+        ax, ay, az = rng.normal(scale=2.0, size=3) + [0.0, 0.0, 9.8]
+        p, q, r = rng.normal(scale=0.3, size=3)
+
+        # Angles from the accelerometer and Euler angle rates from the gyro, as the callback computed them
+        phi_acc = math.atan2(ay, math.sqrt(ax ** 2.0 + az ** 2.0))
+        theta_acc = math.atan2(-ax, math.sqrt(ay ** 2.0 + az ** 2.0))
+        phi_dot = p + math.sin(phi_hat) * math.tan(theta_hat) * q + math.cos(phi_hat) * math.tan(theta_hat) * r
+        theta_dot = math.cos(phi_hat) * q - math.sin(phi_hat) * r
+        state_estimate, P = reference_step(state_estimate, P, np.eye(4), np.eye(2), dt,
+                                           phi_dot, theta_dot, phi_acc, theta_acc)
+        phi_hat = state_estimate[0, 0]
+        theta_hat = state_estimate[2, 0]
+
+        phi, theta = flt.update(StylusReading(np.array([ax, ay, az]), np.array([p, q, r]), 0, 0.5), t)
+        assert flt.phi_hat == pytest.approx(phi_hat, abs=1e-12)
+        assert flt.theta_hat == pytest.approx(theta_hat, abs=1e-12)
+        assert phi == np.round(phi_hat * 180.0 / math.pi, 2)
+        assert theta == np.round(theta_hat * 180.0 / math.pi, 2)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from reading_ring import READING_DTYPE, ReadingRing
+
+
+@pytest.fixture
+def ring():
+    ring = ReadingRing(8)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def put(ring, i):
+    return ring.put(np.array([i, 0.5, -i]), np.zeros(3), 1000.0 + i, 0.25, 0.1 * i, -0.1 * i)
+
+
+def test_drain(ring):
+    for i in range(5):
+        assert put(ring, i)
+    batch = ring.drain()
+    assert batch.dtype == READING_DTYPE
+    np.testing.assert_array_equal(batch["t"], 1000.0 + np.arange(5))
+    np.testing.assert_array_equal(batch["accel"][2], [2, 0.5, -2])
+    np.testing.assert_allclose(batch["phi"], 0.1 * np.arange(5), rtol=1e-6)
+    assert len(ring.drain()) == 0
+
+
+def test_drain_wrapped(ring):
+    for i in range(6):
+        put(ring, i)
+    assert len(ring.drain()) == 6
+    # Pending readings 6..11 run from slot 6 past the end of the ring to slot 3
+    for i in range(6, 12):
+        put(ring, i)
+    batch = ring.drain()
+    np.testing.assert_array_equal(batch["t"], 1000.0 + np.arange(6, 12))
+    np.testing.assert_array_equal(batch["accel"][:, 0], np.arange(6, 12))
+    assert ring.dropped == 0
+
+
+def test_drop_counting(ring):
+    for i in range(11):
+        put(ring, i)
+    assert ring.dropped == 3
+    # The oldest readings are kept, the ones that found the ring full are lost
+    np.testing.assert_array_equal(ring.drain()["t"], 1000.0 + np.arange(8))
+    assert put(ring, 11)
+    np.testing.assert_array_equal(ring.drain()["t"], [1011.0])
+    assert ring.dropped == 3